@@ -0,0 +1,126 @@
+"""Persistent search results shared between sessions and processes
+
+A SQLite table keeps, for each position key, the deepest result seen so far: search depth,
+score, bound type and best move. New results are buffered and written in batches; callers
+running in worker processes must flush() at the end of each task, since atexit handlers do
+not run there. Lookups mark entries as recently used, and every prune_interval flushes the
+least recently used positions beyond max_entries are deleted.
+
+A meta table records the engine version the results were computed with; opening the cache
+with a different version empties it. Results that depend on the evaluation parameters must
+be keyed accordingly by the caller.
+
+    CHESS_ANALYSIS_CACHE=analysis.sqlite python main.py
+"""
+import os
+import sqlite3
+import time
+
+EXACT, LOWER, UPPER = 0, 1, 2  # Bound types: exact score, score >= stored, score <= stored
+NO_MOVE = -1
+
+def signed(position):
+    """Map an unsigned 64-bit hash onto SQLite's signed INTEGER range"""
+    return position - (1 << 64) if position >= 1 << 63 else position
+
+class AnalysisCache:
+    def __init__(self, path, version, max_entries=1000000, batch_size=256, prune_interval=64):
+        self.path = path
+        self.version = str(version)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.prune_interval = prune_interval
+        self.connection = None
+        self.connect()
+    
+    def connect(self):
+        """Open the database for this process; a connection must not be used across fork()"""
+        self.pid = os.getpid()
+        self.pending = {}  # Signed hash -> (depth, score, bound, move, last_used) not yet written
+        self.touched = {}  # Signed hash -> last_used for entries read since the last flush
+        self.flushes = 0
+        # The UI searches on a worker thread; only one thread uses the cache at a time
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL lets several engine processes read while one of them writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS positions (
+                hash INTEGER PRIMARY KEY, depth INTEGER, score REAL, bound INTEGER, move INTEGER, last_used INTEGER)''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS positions_last_used ON positions (last_used)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            stored = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if stored is None or stored[0] != self.version:
+                # Results of another engine version mean something else; start over
+                self.connection.execute('DELETE FROM positions')
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                                        (self.version,))
+    
+    def check_process(self):
+        """Reconnect in a forked child instead of sharing the parent's connection"""
+        if self.pid != os.getpid():
+            self.connect()
+    
+    def probe(self, position, depth):
+        """(score, bound, move) stored for position at depth or deeper, else None"""
+        self.check_process()
+        key = signed(position)
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.connection.execute('SELECT depth, score, bound, move FROM positions WHERE hash = ?',
+                                            (key,)).fetchone()
+            if entry is not None:
+                self.touched[key] = time.time_ns()
+        if entry is None or entry[0] < depth:
+            return None
+        return entry[1], entry[2], None if entry[3] == NO_MOVE else entry[3]
+    
+    def store(self, position, depth, score, bound, move=None):
+        self.check_process()
+        key = signed(position)
+        entry = self.pending.get(key)
+        if entry is not None and entry[0] > depth:
+            return
+        self.pending[key] = (depth, score, bound, NO_MOVE if move is None else move, time.time_ns())
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered results and recency updates, evicting down to max_entries every prune_interval flushes"""
+        self.check_process()
+        if not self.pending and not self.touched:
+            return
+        self.flushes += 1
+        with self.connection:
+            # Keep whichever result was searched deeper
+            self.connection.executemany(
+                '''INSERT INTO positions (hash, depth, score, bound, move, last_used) VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (hash) DO UPDATE SET depth = excluded.depth, score = excluded.score,
+                       bound = excluded.bound, move = excluded.move, last_used = excluded.last_used
+                   WHERE excluded.depth >= positions.depth''',
+                [(key,) + entry for key, entry in self.pending.items()])
+            self.connection.executemany('UPDATE positions SET last_used = ? WHERE hash = ?',
+                                        [(last_used, key) for key, last_used in self.touched.items()])
+            # Counting rows scans the table, so the size is only checked now and then
+            if self.flushes % self.prune_interval == 0:
+                self.prune()
+        self.pending.clear()
+        self.touched.clear()
+    
+    def prune(self):
+        count, = self.connection.execute('SELECT COUNT(*) FROM positions').fetchone()
+        if count > self.max_entries:
+            self.connection.execute('''DELETE FROM positions WHERE hash IN
+                (SELECT hash FROM positions ORDER BY last_used LIMIT ?)''', (count - self.max_entries,))
+    
+    def __len__(self):
+        self.flush()
+        return self.connection.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+    
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.flush()
+            with self.connection:
+                self.prune()
+            self.connection.close()
+            self.connection = None
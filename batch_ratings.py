@@ -0,0 +1,136 @@
+"""Batch skill ratings for every player in a game archive
+
+Replays archived games through PlayerStats on a process pool and aggregates the
+calculate_skill_rating results per player. Progress is checkpointed to disk, so an
+interrupted run picks up where it stopped, and a rerun after games were appended to the
+archive only rates the new ones:
+
+    python batch_ratings.py games.cga --output ratings.csv
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from chess_engine import PlayerStats, create_board, make_move_with_stats
+from game_archive import GameArchive, decode_move
+
+worker_archives = {}  # Archives opened by this worker process, by path
+
+def replay_stats(codes):
+    """Replay encoded moves from the start position; returns (white_stats, black_stats)"""
+    board = create_board()
+    stats = {'white': PlayerStats('white'), 'black': PlayerStats('black')}
+    color = 'white'
+    for code in codes:
+        start, end, promotion = decode_move(code)
+        opponent = 'black' if color == 'white' else 'white'
+        make_move_with_stats(board, start, end, promotion, stats[color], stats[opponent])
+        color = opponent
+    return stats['white'], stats['black']
+
+def rate_chunk(task):
+    """Rate games [start, stop) of an archive; returns (chunk_id, per-player totals)"""
+    path, chunk_id, start, stop = task
+    archive = worker_archives.get(path)
+    if archive is None:
+        archive = worker_archives[path] = GameArchive(path)
+    
+    # Totals per player: games, wins, draws, losses, sum of skill ratings
+    totals = {}
+    for n in range(start, stop):
+        game = archive[n]
+        white_stats, black_stats = replay_stats(game.moves)
+        for name, stats, win, loss in ((game.white, white_stats, '1-0', '0-1'),
+                                       (game.black, black_stats, '0-1', '1-0')):
+            entry = totals.setdefault(name, [0, 0, 0, 0, 0])
+            entry[0] += 1
+            entry[1] += game.result == win
+            entry[2] += game.result == '1/2-1/2'
+            entry[3] += game.result == loss
+            entry[4] += stats.calculate_skill_rating()
+    return chunk_id, totals
+
+def load_checkpoint(path, archive_path, chunk_size, game_count):
+    """({chunk_id: games rated up to}, players) of a checkpoint for this archive, else ({}, {})
+
+    Archives only grow, so a checkpoint that rated games the archive no longer has
+    belongs to another archive and is ignored.
+    """
+    if path and os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if (checkpoint['archive'] == os.path.abspath(archive_path) and checkpoint['chunk_size'] == chunk_size
+                and 'rated' in checkpoint):
+            rated = {chunk_id: stop for chunk_id, stop in checkpoint['rated']}
+            if all(stop <= game_count for stop in rated.values()):
+                return rated, checkpoint['players']
+    return {}, {}
+
+def save_checkpoint(path, archive_path, chunk_size, rated, players):
+    # Write to a temporary file first so an interruption never leaves a torn checkpoint
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'archive': os.path.abspath(archive_path), 'chunk_size': chunk_size,
+                   'rated': sorted(rated.items()), 'players': players}, f)
+    os.replace(path + '.tmp', path)
+
+def pending_tasks(archive_path, chunk_size, game_count, rated):
+    """rate_chunk tasks for the games no chunk has rated yet, including games appended to
+    the last chunk since the checkpoint"""
+    tasks = []
+    for chunk_id in range((game_count + chunk_size - 1) // chunk_size):
+        start = rated.get(chunk_id, chunk_id * chunk_size)
+        stop = min(game_count, (chunk_id + 1) * chunk_size)
+        if start < stop:
+            tasks.append((archive_path, chunk_id, start, stop))
+    return tasks
+
+def write_ratings(path, players):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['player', 'games', 'wins', 'draws', 'losses', 'average_rating'])
+        ranked = sorted(players.items(), key=lambda item: item[1][4] / item[1][0], reverse=True)
+        for name, (games, wins, draws, losses, rating_sum) in ranked:
+            writer.writerow([name, games, wins, draws, losses, f"{rating_sum / games:.1f}"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute PlayerStats skill ratings over a game archive")
+    parser.add_argument('archive', help="archive written by game_archive.py")
+    parser.add_argument('--output', default='ratings.csv', help="CSV file for the per-player results")
+    parser.add_argument('--checkpoint', default=None, help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=1000, help="games per task")
+    parser.add_argument('--checkpoint-every', type=int, default=20, help="chunks between checkpoint writes")
+    args = parser.parse_args(argv)
+    checkpoint_path = args.checkpoint or args.output + '.checkpoint'
+    
+    with GameArchive(args.archive) as archive:
+        game_count = len(archive)
+    chunk_count = (game_count + args.chunk_size - 1) // args.chunk_size
+    rated, players = load_checkpoint(checkpoint_path, args.archive, args.chunk_size, game_count)
+    tasks = pending_tasks(args.archive, args.chunk_size, game_count, rated)
+    stops = {chunk_id: stop for _, chunk_id, _, stop in tasks}
+    if rated:
+        print(f"Resuming: {len(tasks)} of {chunk_count} chunks left to rate", file=sys.stderr)
+    
+    start_time = time.time()
+    with multiprocessing.Pool(args.workers) as pool:
+        for finished, (chunk_id, totals) in enumerate(pool.imap_unordered(rate_chunk, tasks), 1):
+            for name, entry in totals.items():
+                aggregate = players.setdefault(name, [0, 0, 0, 0, 0])
+                for i, value in enumerate(entry):
+                    aggregate[i] += value
+            rated[chunk_id] = stops[chunk_id]
+            if finished % args.checkpoint_every == 0 or finished == len(tasks):
+                save_checkpoint(checkpoint_path, args.archive, args.chunk_size, rated, players)
+                rate = finished * args.chunk_size / max(time.time() - start_time, 1e-9)
+                print(f"{finished}/{len(tasks)} chunks, ~{rate:.0f} games/s", file=sys.stderr)
+    
+    write_ratings(args.output, players)
+    print(f"Rated {len(players)} players from {game_count} games into {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    sys.exit(main())
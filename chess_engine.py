@@ -0,0 +1,1067 @@
+"""Chess rules, evaluation, AI search and player statistics, independent of pygame"""
+import atexit
+import copy
+import hashlib
+import json
+import math
+import os
+import random
+import time
+
+from analysis_cache import EXACT, LOWER, UPPER, AnalysisCache
+
+BOARD_SIZE = 8
+
+# Boards are always stored with white on rows 6-7 (row 7 is rank 1, column 0 the a-file);
+# the UI flips the view, never the board
+ 
+# Piece values for evaluation
+PIECE_VALUES = {
+    'pawn': 100,
+    'knight': 320,
+    'bishop': 330,
+    'rook': 500,
+    'queen': 900,
+    'king': 20000
+}
+ 
+# Pawn structure terms used by evaluate_position, in centipawns per pawn
+PAWN_STRUCTURE = {
+    'doubled': -15,
+    'isolated': -12,
+    'passed': [0, 5, 10, 20, 35, 60, 100, 0]  # Passed pawn bonus by rank, counted from its own side
+}
+ 
+# Add these constants for skill measurement
+SKILL_METRICS = {
+    'piece_value': {
+        'pawn': 1,
+        'knight': 3,
+        'bishop': 3,
+        'rook': 5,
+        'queen': 9,
+        'king': 0
+    },
+    'position_bonus': {
+        'center_control': 2,  # Bonus for controlling center squares
+        'pawn_structure': 1,  # Bonus for good pawn structure
+        'piece_development': 1.5,  # Bonus for developing pieces early
+        'king_safety': 2  # Bonus for king safety
+    }
+}
+
+def load_parameters(path):
+    """Load tuned piece values (e.g. from texel_tune.py) into PIECE_VALUES and SKILL_METRICS"""
+    with open(path) as f:
+        params = json.load(f)
+    PIECE_VALUES.update(params.get('piece_values', {}))
+    PAWN_STRUCTURE.update(params.get('pawn_structure', {}))
+    SKILL_METRICS['piece_value'].update(params.get('skill_piece_values', {}))
+    clear_evaluation_cache()
+
+class PlayerStats:
+    def __init__(self, color):
+        self.color = color
+        self.pieces_captured = []
+        self.capture_points = 0
+        self.moves_made = 0
+        self.center_control_moves = 0
+        self.pieces_developed = set()
+        self.check_moves = 0
+        self.pawn_structure_score = 0
+        self.king_safety_score = 0
+        # Incremental position tracking, filled from the board on the first update
+        self.pawn_files = None  # Own pawns per file
+        self.king_pos = None
+        
+    def update_stats(self, board, move_from, move_to, captured_piece=None):
+        self.moves_made += 1
+        
+        # Track captured pieces
+        if captured_piece:
+            self.pieces_captured.append(captured_piece)
+            self.capture_points += SKILL_METRICS['piece_value'][captured_piece[1]] * 10
+        
+        # Check for center control (squares e4, e5, d4, d5)
+        center_squares = [(3, 3), (3, 4), (4, 3), (4, 4)]
+        if move_to in center_squares:
+            self.center_control_moves += 1
+        
+        # Track piece development
+        piece = board[move_to[0]][move_to[1]]
+        if piece and piece[1] != 'pawn' and piece[1] != 'king':
+            self.pieces_developed.add((piece[1], move_from))
+        
+        # Apply the move to the tracked pawns and king
+        if self.pawn_files is None:
+            self.track_position(board)
+        elif piece and piece[1] == 'pawn':
+            self.pawn_files[move_from[1]] -= 1
+            self.pawn_files[move_to[1]] += 1
+        elif piece and piece[1] == 'king':
+            self.king_pos = move_to
+        
+        # Update pawn structure score
+        self.update_pawn_structure(board)
+        
+        # Update king safety score
+        self.update_king_safety(board)
+    
+    def track_position(self, board):
+        """Scan the board once to seed the per-file pawn counts and the king square"""
+        self.pawn_files = [0] * BOARD_SIZE
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                piece = board[row][col]
+                if piece and piece[0] == self.color:
+                    if piece[1] == 'pawn':
+                        self.pawn_files[col] += 1
+                    elif piece[1] == 'king' and self.king_pos is None:
+                        self.king_pos = (row, col)
+    
+    def observe_opponent_move(self, move_to, captured_piece=None):
+        # Only captures of our pawns change what we track
+        if self.pawn_files is not None and captured_piece == (self.color, 'pawn'):
+            self.pawn_files[move_to[1]] -= 1
+    
+    def record_promotion(self, pos):
+        if self.pawn_files is not None:
+            self.pawn_files[pos[1]] -= 1
+    
+    def update_pawn_structure(self, board):
+        self.pawn_structure_score = 0
+        for pawn_count in self.pawn_files:
+            # Penalize doubled pawns, reward connected pawns
+            if pawn_count > 1:
+                self.pawn_structure_score -= 1
+            elif pawn_count == 1:
+                self.pawn_structure_score += 1
+    
+    def update_king_safety(self, board):
+        if self.king_pos:
+            # Check pawns in front of king
+            self.king_safety_score = 0
+            row, col = self.king_pos
+            pawn_shield = 0
+            for r in range(max(0, row-1), min(BOARD_SIZE, row+2)):
+                for c in range(max(0, col-1), min(BOARD_SIZE, col+2)):
+                    piece = board[r][c]
+                    if piece and piece[0] == self.color and piece[1] == 'pawn':
+                        pawn_shield += 1
+            self.king_safety_score = pawn_shield * 0.5
+
+    def calculate_skill_rating(self):
+        # Base score starts at 1000
+        score = 1000
+        
+        # Add points for captured pieces
+        score += self.capture_points
+        
+        # Add points for center control
+        score += self.center_control_moves * SKILL_METRICS['position_bonus']['center_control'] * 15
+        
+        # Add points for piece development
+        score += len(self.pieces_developed) * SKILL_METRICS['position_bonus']['piece_development'] * 20
+        
+        # Add points for pawn structure
+        score += self.pawn_structure_score * SKILL_METRICS['position_bonus']['pawn_structure'] * 10
+        
+        # Add points for king safety
+        score += self.king_safety_score * SKILL_METRICS['position_bonus']['king_safety'] * 15
+        
+        # Add bonus for checkmate
+        if self.check_moves > 0:
+            score += self.check_moves * 25
+        
+        return int(score)
+
+# Game logic functions
+def get_raw_moves(board, start_pos, piece):
+    """Get moves without considering check (to avoid recursion)"""
+    valid_moves = []
+    row, col = start_pos
+    piece_type = piece[1]
+    piece_color = piece[0]
+    
+    # White pawns move up the board from row 6, black pawns down from row 1
+    direction = -1 if piece_color == 'white' else 1
+    start_row = 6 if piece_color == 'white' else 1
+ 
+    if piece_type == 'pawn':
+        # Forward move
+        new_row = row + direction
+        if 0 <= new_row < BOARD_SIZE:
+            if not board[new_row][col]:
+                valid_moves.append((new_row, col))
+                # Initial two-square move
+                if row == start_row:
+                    new_row = row + 2 * direction
+                    if 0 <= new_row < BOARD_SIZE and not board[new_row][col]:
+                        valid_moves.append((new_row, col))
+       
+        # Diagonal captures
+        for dcol in [-1, 1]:
+            new_col = col + dcol
+            new_row = row + direction
+            if 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
+                target = board[new_row][new_col]
+                if target and target[0] != piece_color:
+                    valid_moves.append((new_row, new_col))
+ 
+    elif piece_type in ['rook', 'bishop', 'queen']:
+        directions = []
+        if piece_type in ['rook', 'queen']:
+            directions.extend([(0, 1), (0, -1), (1, 0), (-1, 0)])
+        if piece_type in ['bishop', 'queen']:
+            directions.extend([(1, 1), (1, -1), (-1, 1), (-1, -1)])
+        
+        for drow, dcol in directions:
+            new_row, new_col = row + drow, col + dcol
+            while 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
+                target = board[new_row][new_col]
+                if not target:
+                    valid_moves.append((new_row, new_col))
+                else:
+                    if target[0] != piece_color:
+                        valid_moves.append((new_row, new_col))
+                    break
+                new_row += drow
+                new_col += dcol
+ 
+    elif piece_type == 'knight':
+        moves = [
+            (row + 2, col + 1), (row + 2, col - 1),
+            (row - 2, col + 1), (row - 2, col - 1),
+            (row + 1, col + 2), (row + 1, col - 2),
+            (row - 1, col + 2), (row - 1, col - 2)
+        ]
+        for new_row, new_col in moves:
+            if 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
+                target = board[new_row][new_col]
+                if not target or target[0] != piece_color:
+                    valid_moves.append((new_row, new_col))
+ 
+    elif piece_type == 'king':
+        directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+        for drow, dcol in directions:
+            new_row, new_col = row + drow, col + dcol
+            if 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
+                target = board[new_row][new_col]
+                if not target or target[0] != piece_color:
+                    valid_moves.append((new_row, new_col))
+    
+    return valid_moves
+ 
+def get_valid_moves(board, start_pos, piece):
+    valid_moves = []
+    raw_moves = get_raw_moves(board, start_pos, piece)
+   
+    # Test each move to ensure it doesn't leave or put the king in check
+    for move in raw_moves:
+        temp_board = [row[:] for row in board]
+        temp_board[move[0]][move[1]] = piece
+        temp_board[start_pos[0]][start_pos[1]] = ''
+       
+        if not is_in_check(temp_board, piece[0]):
+            valid_moves.append(move)
+ 
+    return valid_moves
+ 
+def evaluate_board(board):
+    score = 0
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece:
+                value = PIECE_VALUES[piece[1]]
+                if piece[0] == 'white':
+                    score += value
+                else:
+                    score -= value
+    return score
+ 
+class ScoreTable:
+    """Fixed-size hash table of scores; each key goes to the slot given by its low bits, replacing the old entry"""
+    def __init__(self, size_bits):
+        self.mask = (1 << size_bits) - 1
+        self.keys = [None] * (self.mask + 1)
+        self.scores = [0] * (self.mask + 1)
+        self.probes = 0
+        self.hits = 0
+    
+    def get(self, key):
+        self.probes += 1
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        return None
+    
+    def store(self, key, score):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+    
+    def clear(self):
+        self.keys = [None] * (self.mask + 1)
+
+eval_table = ScoreTable(16)  # Full evaluation by position hash
+pawn_table = ScoreTable(12)  # Pawn structure score by pawn-only hash; pawn structures change rarely
+
+def parameter_fingerprint():
+    """64-bit hash of the evaluation parameters, mixed into analysis cache keys"""
+    params = json.dumps([PIECE_VALUES, PAWN_STRUCTURE], sort_keys=True).encode()
+    return int.from_bytes(hashlib.blake2b(params, digest_size=8).digest(), 'little')
+
+evaluation_key = parameter_fingerprint()
+
+def clear_evaluation_cache():
+    """Forget cached evaluations and rekey the analysis cache; call after changing PIECE_VALUES or PAWN_STRUCTURE"""
+    global evaluation_key
+    eval_table.clear()
+    pawn_table.clear()
+    evaluation_key = parameter_fingerprint()
+
+def pawn_structure_score(white_pawns, black_pawns):
+    """Doubled, isolated and passed pawn terms from white's point of view, given (row, col) lists"""
+    score = 0
+    for pawns, enemy_pawns, sign in ((white_pawns, black_pawns, 1), (black_pawns, white_pawns, -1)):
+        files = [0] * BOARD_SIZE
+        for _, col in pawns:
+            files[col] += 1
+        for count in files:
+            if count > 1:
+                score += sign * (count - 1) * PAWN_STRUCTURE['doubled']
+        for row, col in pawns:
+            if not any(files[c] for c in (col - 1, col + 1) if 0 <= c < BOARD_SIZE):
+                score += sign * PAWN_STRUCTURE['isolated']
+            # Passed: no enemy pawn ahead on its own or an adjacent file (white moves toward row 0)
+            if not any(abs(c - col) <= 1 and (r < row if sign == 1 else r > row) for r, c in enemy_pawns):
+                rank = BOARD_SIZE - 1 - row if sign == 1 else row
+                score += sign * PAWN_STRUCTURE['passed'][rank]
+    return score
+
+def evaluate_position(board, position=None):
+    """evaluate_board plus pawn structure; position is the board's Zobrist hash, if known, for the eval cache"""
+    if position is not None:
+        score = eval_table.get(position)
+        if score is not None:
+            return score
+    score = 0
+    pawn_key = 0
+    pawns = {'white': [], 'black': []}
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece:
+                value = PIECE_VALUES[piece[1]]
+                if piece[0] == 'white':
+                    score += value
+                else:
+                    score -= value
+                if piece[1] == 'pawn':
+                    pawn_key ^= ZOBRIST_PIECES[piece][square_index((row, col))]
+                    pawns[piece[0]].append((row, col))
+    structure = pawn_table.get(pawn_key)
+    if structure is None:
+        structure = pawn_structure_score(pawns['white'], pawns['black'])
+        pawn_table.store(pawn_key, structure)
+    score += structure
+    if position is not None:
+        eval_table.store(position, score)
+    return score
+ 
+def get_all_moves(board, color):
+    """All legal (start, end) moves for color"""
+    moves = []
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece and piece[0] == color:
+                for move in get_valid_moves(board, (row, col), piece):
+                    moves.append(((row, col), move))
+    return moves
+ 
+def is_in_check(board, color):
+    # Find king position
+    king_pos = None
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece and piece[0] == color and piece[1] == 'king':
+                king_pos = (row, col)
+                break
+        if king_pos:
+            break
+   
+    # Check if any opponent piece can attack the king
+    opponent = 'black' if color == 'white' else 'white'
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece and piece[0] == opponent:
+                moves = get_raw_moves(board, (row, col), piece)  # Use raw moves to avoid recursion
+                if king_pos in moves:
+                    return True
+    return False
+ 
+def is_checkmate(board, color):
+    if not is_in_check(board, color):
+        return False
+   
+    # Try all possible moves for all pieces
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece and piece[0] == color:
+                valid_moves = get_valid_moves(board, (row, col), piece)
+                for move in valid_moves:
+                    # Try the move
+                    temp_board = [row[:] for row in board]
+                    temp_board[move[0]][move[1]] = piece
+                    temp_board[row][col] = ''
+                   
+                    # If this move gets us out of check, it's not checkmate
+                    if not is_in_check(temp_board, color):
+                        return False
+    return True
+ 
+def is_stalemate(board, color):
+    if is_in_check(board, color):
+        return False
+   
+    # Check if any piece has valid moves
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece and piece[0] == color:
+                valid_moves = get_valid_moves(board, (row, col), piece)
+                if valid_moves:
+                    return False
+    return True
+ 
+KNIGHT_JUMPS = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
+KING_STEPS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+ 
+def least_valuable_attacker(board, square, color):
+    """Position of color's cheapest piece attacking square, or None; pins are ignored"""
+    row, col = square
+    best = None
+    best_value = None
+    
+    def consider(pos, piece_type):
+        nonlocal best, best_value
+        if best_value is None or PIECE_VALUES[piece_type] < best_value:
+            best, best_value = pos, PIECE_VALUES[piece_type]
+    
+    # A white pawn attacks diagonally upwards, so it stands one row below the square
+    pawn_row = row + 1 if color == 'white' else row - 1
+    for dcol in (-1, 1):
+        r, c = pawn_row, col + dcol
+        if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE and board[r][c] == (color, 'pawn'):
+            return (r, c)
+    for drow, dcol in KNIGHT_JUMPS:
+        r, c = row + drow, col + dcol
+        if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE and board[r][c] == (color, 'knight'):
+            consider((r, c), 'knight')
+    # The first piece along each line; pieces behind it join in once it has been traded off
+    for drow, dcol in KING_STEPS:
+        sliders = ('rook', 'queen') if drow == 0 or dcol == 0 else ('bishop', 'queen')
+        r, c = row + drow, col + dcol
+        distance = 1
+        while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+            piece = board[r][c]
+            if piece:
+                if piece[0] == color and (piece[1] in sliders or (piece[1] == 'king' and distance == 1)):
+                    consider((r, c), piece[1])
+                break
+            r += drow
+            c += dcol
+            distance += 1
+    return best
+ 
+def static_exchange(board, start_pos, end_pos):
+    """Material the mover expects to win from a capture once the exchange on the square is over
+
+    Each side recaptures with its cheapest attacker and stops when going on would lose more.
+    """
+    board = [row[:] for row in board]
+    piece = board[start_pos[0]][start_pos[1]]
+    target = board[end_pos[0]][end_pos[1]]
+    gain = [PIECE_VALUES[target[1]] if target else 0]
+    on_square = PIECE_VALUES[piece[1]]
+    board[end_pos[0]][end_pos[1]] = piece
+    board[start_pos[0]][start_pos[1]] = ''
+    side = 'black' if piece[0] == 'white' else 'white'
+    while True:
+        attacker = least_valuable_attacker(board, end_pos, side)
+        if attacker is None:
+            break
+        # Score if this side captures and the other side then stops
+        gain.append(on_square - gain[-1])
+        on_square = PIECE_VALUES[board[attacker[0]][attacker[1]][1]]
+        board[end_pos[0]][end_pos[1]] = board[attacker[0]][attacker[1]]
+        board[attacker[0]][attacker[1]] = ''
+        side = 'black' if side == 'white' else 'white'
+    # Walk back: each side only captures if that beats stopping
+    for depth in range(len(gain) - 1, 0, -1):
+        gain[depth - 1] = -max(-gain[depth - 1], gain[depth])
+    return gain[0]
+ 
+def get_captures(board, color):
+    """All legal captures for color as (start, end) moves"""
+    captures = []
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece and piece[0] == color:
+                for move in get_raw_moves(board, (row, col), piece):
+                    if not board[move[0]][move[1]]:
+                        continue
+                    temp_board = [row[:] for row in board]
+                    temp_board[move[0]][move[1]] = piece
+                    temp_board[row][col] = ''
+                    if not is_in_check(temp_board, color):
+                        captures.append(((row, col), move))
+    return captures
+ 
+class SearchStats:
+    """Counters collected during one AI search"""
+    def __init__(self, side):
+        self.side = side
+        self.nodes = 0
+        self.qnodes = 0  # Quiescence nodes
+        self.tt_probes = 0  # Transposition table lookups
+        self.tt_hits = 0
+        self.history_draws = 0  # Positions scored as drawn by repetition or the fifty-move rule
+        self.deadline = None  # perf_counter() time at which the search is abandoned
+        self.node_limit = None  # Nodes, quiescence included, after which the search is abandoned
+        self.aborted = False
+        self.eval_probes = 0  # Evaluation and pawn structure table lookups
+        self.eval_hits = 0
+        self.pawn_probes = 0
+        self.pawn_hits = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0  # Cutoffs produced by the first move searched
+        self.interior_nodes = 0
+        self.moves_generated = 0
+        self.depth_times_ms = []
+        self.depth_nodes = []
+        self.pv_table = {}  # Principal variation from each ply, rebuilt as the search runs
+        self.pv = []
+        self.pv_hint = []  # Previous iteration's principal variation, tried first at each ply
+        self.depth = 0
+        self.score = None
+        self.best_move = None
+        self.elapsed_ms = 0.0
+    
+    def to_dict(self):
+        return {
+            'event': 'search',
+            'timestamp': time.time(),
+            'side': self.side,
+            'depth': self.depth,
+            'score': self.score if self.score is not None and math.isfinite(self.score) else None,
+            'mate_found': self.score is not None and math.isinf(self.score),
+            'aborted': self.aborted,
+            'best_move': self.best_move,
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'eval_hit_rate': self.eval_hits / self.eval_probes if self.eval_probes else None,
+            'pawn_hit_rate': self.pawn_hits / self.pawn_probes if self.pawn_probes else None,
+            'beta_cutoffs': self.beta_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else None,
+            'branching_factor': self.moves_generated / self.interior_nodes if self.interior_nodes else None,
+            'depth_times_ms': self.depth_times_ms,
+            'depth_nodes': self.depth_nodes,
+            'pv': self.pv,
+            'elapsed_ms': self.elapsed_ms,
+            'nps': int(self.nodes * 1000 / self.elapsed_ms) if self.elapsed_ms else None,
+        }
+    
+    def out_of_budget(self):
+        if self.node_limit is not None and self.nodes + self.qnodes > self.node_limit:
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+class SearchLog:
+    """Telemetry sink that appends each search as one JSON line to a file"""
+    def __init__(self, path):
+        self.path = path
+    
+    def __call__(self, record):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+# Receives the stats dict of every search; set CHESS_SEARCH_LOG to log them to a file
+search_telemetry = SearchLog(os.environ['CHESS_SEARCH_LOG']) if os.environ.get('CHESS_SEARCH_LOG') else None
+
+# Bump whenever search or evaluation changes what a cached score means; older caches are emptied
+ENGINE_VERSION = 4
+
+# Search results kept across sessions; set CHESS_ANALYSIS_CACHE to a SQLite file to enable it.
+# Entries are keyed by position hash XOR evaluation_key, so other parameter sets never match
+analysis_cache = (AnalysisCache(os.environ['CHESS_ANALYSIS_CACHE'], ENGINE_VERSION)
+                  if os.environ.get('CHESS_ANALYSIS_CACHE') else None)
+if analysis_cache is not None:
+    atexit.register(analysis_cache.close)
+
+def flush_analysis_cache():
+    """Write pending analysis; worker processes call this per task since atexit does not run there"""
+    if analysis_cache is not None:
+        analysis_cache.flush()
+CACHE_MIN_DEPTH = 2  # Shallower nodes are cheaper to search again than to look up
+FIFTY_MOVE_PLIES = 100
+DRAW_SCORE = 0
+REDUCTION_MIN_DEPTH = 2  # Losing captures are searched one ply shallower from this depth on
+
+class SearchAborted(Exception):
+    """Raised inside the search once its hard time limit or node budget is spent"""
+
+def quiescence(board, alpha, beta, maximizing_player, stats=None, position=None):
+    """Search captures that do not lose material until the position is quiet; position is its hash, if known"""
+    if stats is not None:
+        stats.qnodes += 1
+        if stats.out_of_budget():
+            raise SearchAborted
+    stand_pat = evaluate_position(board, position)
+    # The side to move can always decline to capture
+    if maximizing_player:
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+    else:
+        if stand_pat <= alpha:
+            return stand_pat
+        beta = min(beta, stand_pat)
+    
+    captures = []
+    for start, end in get_captures(board, 'white' if maximizing_player else 'black'):
+        gain = static_exchange(board, start, end)
+        if gain >= 0:  # Losing captures are pruned
+            captures.append((gain, start, end))
+    captures.sort(reverse=True)
+    
+    best = stand_pat
+    for _, start, end in captures:
+        child_position = hash_after_move(position, board, start, end) if position is not None else None
+        temp_board = [row[:] for row in board]
+        temp_board[end[0]][end[1]] = temp_board[start[0]][start[1]]
+        temp_board[start[0]][start[1]] = ''
+        score = quiescence(temp_board, alpha, beta, not maximizing_player, stats, child_position)
+        if maximizing_player:
+            best = max(best, score)
+            alpha = max(alpha, score)
+        else:
+            best = min(best, score)
+            beta = min(beta, score)
+        if beta <= alpha:
+            break
+    return best
+
+# Optimize minimax with move ordering and better pruning
+def minimax(board, depth, alpha, beta, maximizing_player, stats=None, ply=0, cache=None, history=None):
+    if stats is not None:
+        stats.nodes += 1
+        stats.pv_table[ply] = []
+        if stats.out_of_budget():
+            raise SearchAborted
+    if depth <= 0:
+        position = history.hashes[-1] if history is not None else None
+        return quiescence(board, alpha, beta, maximizing_player, stats, position), None
+    
+    position = None  # Analysis cache key of this node, if it is looked up
+    if cache is not None and depth >= CACHE_MIN_DEPTH:
+        if history is not None:
+            position = history.hashes[-1] ^ evaluation_key
+        else:
+            position = position_hash(board, 'white' if maximizing_player else 'black') ^ evaluation_key
+        entry = cache.probe(position, depth)
+        if stats is not None:
+            stats.tt_probes += 1
+        if entry is not None:
+            score, bound, code = entry
+            if bound == EXACT or (bound == LOWER and score >= beta) or (bound == UPPER and score <= alpha):
+                best_move = (index_square(code & 0x3F), index_square(code >> 6)) if code is not None else None
+                if stats is not None:
+                    stats.tt_hits += 1
+                    stats.pv_table[ply] = [best_move] if best_move else []
+                return score, best_move
+    alpha_start, beta_start = alpha, beta
+    # Draws by repetition or the fifty-move rule depend on the game, not just the position,
+    # so results that saw one are not cached
+    draws_before = stats.history_draws if stats is not None else None
+
+    # The previous iteration's move at this ply first, then winning captures, best exchange
+    # first, then quiet moves and equal trades (both gain 0) in generation order, then
+    # losing captures
+    moves = []
+    for start, end in get_all_moves(board, 'white' if maximizing_player else 'black'):
+        gain = static_exchange(board, start, end) if board[end[0]][end[1]] else 0
+        moves.append((gain, start, end))
+    moves.sort(key=lambda move: move[0], reverse=True)
+    if stats is not None and ply < len(stats.pv_hint):
+        for i, (gain, start, end) in enumerate(moves):
+            if (start, end) == stats.pv_hint[ply]:
+                moves.insert(0, moves.pop(i))
+                break
+    if stats is not None:
+        stats.interior_nodes += 1
+        stats.moves_generated += len(moves)
+
+    if maximizing_player:
+        max_eval = float('-inf')
+        best_move = None
+        for i, (gain, start, end) in enumerate(moves):
+            # Losing captures get a shallower search, repeated in full only if they look good
+            if gain < 0 and depth >= REDUCTION_MIN_DEPTH:
+                eval = child_score(board, start, end, depth - 2, alpha, beta, False, stats, ply, cache, history)
+                if eval > alpha:
+                    eval = child_score(board, start, end, depth - 1, alpha, beta, False, stats, ply, cache, history)
+            else:
+                eval = child_score(board, start, end, depth - 1, alpha, beta, False, stats, ply, cache, history)
+            if eval > max_eval:
+                max_eval = eval
+                best_move = (start, end)
+                if stats is not None:
+                    stats.pv_table[ply] = [best_move] + stats.pv_table.get(ply + 1, [])
+            alpha = max(alpha, eval)
+            if beta <= alpha:
+                if stats is not None:
+                    stats.beta_cutoffs += 1
+                    stats.first_move_cutoffs += i == 0
+                break
+        if position is not None and draws_before is not None and stats.history_draws == draws_before:
+            store_result(cache, position, depth, max_eval, alpha_start, beta_start, best_move)
+        return max_eval, best_move
+    else:
+        min_eval = float('inf')
+        best_move = None
+        for i, (gain, start, end) in enumerate(moves):
+            # Losing captures get a shallower search, repeated in full only if they look good
+            if gain < 0 and depth >= REDUCTION_MIN_DEPTH:
+                eval = child_score(board, start, end, depth - 2, alpha, beta, True, stats, ply, cache, history)
+                if eval < beta:
+                    eval = child_score(board, start, end, depth - 1, alpha, beta, True, stats, ply, cache, history)
+            else:
+                eval = child_score(board, start, end, depth - 1, alpha, beta, True, stats, ply, cache, history)
+            if eval < min_eval:
+                min_eval = eval
+                best_move = (start, end)
+                if stats is not None:
+                    stats.pv_table[ply] = [best_move] + stats.pv_table.get(ply + 1, [])
+            beta = min(beta, eval)
+            if beta <= alpha:
+                if stats is not None:
+                    stats.beta_cutoffs += 1
+                    stats.first_move_cutoffs += i == 0
+                break
+        if position is not None and draws_before is not None and stats.history_draws == draws_before:
+            store_result(cache, position, depth, min_eval, alpha_start, beta_start, best_move)
+        return min_eval, best_move
+ 
+def child_score(board, start, end, depth, alpha, beta, maximizing_player, stats, ply, cache, history):
+    """Score of the position after a move, searched to depth with the opponent to move"""
+    temp_board = [row[:] for row in board]
+    temp_board[end[0]][end[1]] = temp_board[start[0]][start[1]]
+    temp_board[start[0]][start[1]] = ''
+    if history is None:
+        return minimax(temp_board, depth, alpha, beta, maximizing_player, stats, ply + 1, cache)[0]
+    
+    # Any repetition inside the search is scored as a draw, cutting the cycle off
+    history.push_move(board, start, end)
+    if history.is_draw(repetitions=1):
+        score = DRAW_SCORE
+        if stats is not None:
+            stats.pv_table[ply + 1] = []
+            stats.history_draws += 1
+    else:
+        score, _ = minimax(temp_board, depth, alpha, beta, maximizing_player, stats, ply + 1, cache, history)
+    history.pop()
+    return score
+ 
+def store_result(cache, position, depth, score, alpha, beta, best_move):
+    """Save a node's score with the bound type implied by its (alpha, beta) window"""
+    if score <= alpha:
+        bound = UPPER
+    elif score >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    code = square_index(best_move[0]) | square_index(best_move[1]) << 6 if best_move else None
+    cache.store(position, depth, score, bound, code)
+ 
+def search(board, depth, maximizing_player, telemetry=None, cache=None, history=None, soft_limit=None,
+           hard_limit=None, node_limit=None):
+    """Iteratively deepen minimax up to depth; returns (score, move, stats)
+
+    Each iteration searches the previous one's principal variation first. Without a
+    limit or telemetry, only the full depth is searched.
+
+    history is the game's PositionHistory, ending with this position; with it, repeated
+    positions and the fifty-move rule are scored as draws. Without it, repetitions are
+    only detected within the search.
+
+    soft_limit and hard_limit are in seconds: no iteration starts after the soft limit, and
+    one still running at the hard limit, or past node_limit nodes, is abandoned for the last
+    completed result. If that is depth 1 itself, the move is the best root move searched so
+    far, or the first legal one, and the score is None.
+    """
+    if cache is None:
+        cache = analysis_cache
+    stats = SearchStats('white' if maximizing_player else 'black')
+    if history is None:
+        history = PositionHistory(board, stats.side)
+    eval_probes, eval_hits = eval_table.probes, eval_table.hits
+    pawn_probes, pawn_hits = pawn_table.probes, pawn_table.hits
+    root_plies = len(history.hashes)
+    start = time.perf_counter()
+    if hard_limit is not None:
+        stats.deadline = start + hard_limit
+    stats.node_limit = node_limit
+    score, best_move = None, None
+    telemetry = telemetry or search_telemetry
+    # Shallower iterations are only worth their nodes with a limit to fall back from,
+    # or to report statistics per depth
+    iterate = telemetry or soft_limit is not None or hard_limit is not None or node_limit is not None
+    for current_depth in range(1 if iterate else depth, depth + 1):
+        depth_start = time.perf_counter()
+        if current_depth > 1 and soft_limit is not None and depth_start - start >= soft_limit:
+            break
+        nodes_before = stats.nodes
+        stats.pv_hint = stats.pv
+        try:
+            result = minimax(board, current_depth, float('-inf'), float('inf'), maximizing_player, stats,
+                             cache=cache, history=history)
+        except SearchAborted:
+            # Unwind the moves the interrupted iteration left on the history
+            while len(history.hashes) > root_plies:
+                history.pop()
+            stats.aborted = True
+            if best_move is None:
+                root_pv = stats.pv_table.get(0)
+                moves = get_all_moves(board, stats.side)
+                best_move = root_pv[0] if root_pv else moves[0] if moves else None
+            break
+        score, best_move = result
+        stats.depth = current_depth
+        stats.depth_times_ms.append((time.perf_counter() - depth_start) * 1000)
+        stats.depth_nodes.append(stats.nodes - nodes_before)
+        stats.pv = stats.pv_table.get(0, [])
+    
+    stats.score = score
+    stats.best_move = best_move
+    stats.elapsed_ms = (time.perf_counter() - start) * 1000
+    stats.eval_probes = eval_table.probes - eval_probes
+    stats.eval_hits = eval_table.hits - eval_hits
+    stats.pawn_probes = pawn_table.probes - pawn_probes
+    stats.pawn_hits = pawn_table.hits - pawn_hits
+    
+    if telemetry:
+        telemetry(stats.to_dict())
+    return score, best_move, stats
+ 
+# Weaker levels score a sample of the legal moves with small searches and pick one at
+# random, favoring better scores: a softmax with the given temperature in centipawns. The
+# searches share a node budget, so the work per move does not depend on the hardware.
+STRENGTH_LEVELS = {
+    'easy': {'depth': 1, 'nodes': 400, 'moves': 20, 'temperature': 150},
+    'medium': {'depth': 2, 'nodes': 4000, 'moves': 30, 'temperature': 40}
+}
+ 
+def choose_move_at_level(board, color, level, rng=random, history=None, hard_limit=None):
+    """Move for color at one of the STRENGTH_LEVELS, or None without legal moves
+
+    At most settings['moves'] root moves are considered: the captures that do not lose
+    material, then a random sample of the rest. Each first gets a quiescence score; then,
+    best first, as many as the node budget allows are searched to the level's depth. A
+    move whose deeper search is cut off keeps its quiescence score, and moves the budget
+    never reached are left out. Root moves and quiescence nodes count against the budget,
+    so a move costs at most settings['nodes'] nodes plus one move generation at the root.
+    That bounds the latency rather than fixing it: positions the budget covers with nodes
+    to spare finish early, and the time per node still varies several-fold with the
+    number of pieces and captures on the board. hard_limit, in seconds, cuts the budget
+    short for a player low on time.
+    """
+    settings = STRENGTH_LEVELS[level]
+    maximizing_player = color == 'white'
+    captures = []
+    others = []
+    for start, end in get_all_moves(board, color):
+        gain = static_exchange(board, start, end) if board[end[0]][end[1]] else 0
+        if board[end[0]][end[1]] and gain >= 0:
+            captures.append((gain, start, end))
+        else:
+            others.append((gain, start, end))
+    captures.sort(key=lambda move: move[0], reverse=True)
+    moves = captures[:settings['moves']]
+    moves += rng.sample(others, min(len(others), settings['moves'] - len(moves)))
+    if not moves:
+        return None
+    if history is None:
+        history = PositionHistory(board, color)
+    root_plies = len(history.hashes)
+    stats = SearchStats(color)
+    stats.node_limit = settings['nodes']
+    if hard_limit is not None:
+        stats.deadline = time.perf_counter() + hard_limit
+    
+    def mover_score(start, end, depth):
+        """Score of a root move from color's side, with mates capped so the softmax stays finite"""
+        score = child_score(board, start, end, depth, float('-inf'), float('inf'), not maximizing_player, stats, 0,
+                            None, history)
+        score = score if maximizing_player else -score
+        return min(max(score, -PIECE_VALUES['king']), PIECE_VALUES['king'])
+    
+    scored = []  # [score, start, end] of every root move that got at least a quiescence score
+    for _, start, end in moves:
+        try:
+            scored.append([mover_score(start, end, 0), start, end])
+        except SearchAborted:
+            while len(history.hashes) > root_plies:
+                history.pop()
+            break
+    if not scored:  # The budget did not cover a single quiescence search
+        _, start, end = moves[0]
+        return start, end
+    if settings['depth'] > 1:
+        scored.sort(key=lambda entry: entry[0], reverse=True)
+        for entry in scored:
+            try:
+                entry[0] = mover_score(entry[1], entry[2], settings['depth'] - 1)
+            except SearchAborted:
+                while len(history.hashes) > root_plies:
+                    history.pop()
+                break
+    
+    best = max(score for score, _, _ in scored)
+    weights = [math.exp((score - best) / settings['temperature']) for score, _, _ in scored]
+    _, start, end = rng.choices(scored, weights)[0]
+    return start, end
+ 
+def create_board():
+    board = [['' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    
+    # Set up pawns
+    for i in range(BOARD_SIZE):
+        board[6][i] = ('white', 'pawn')  # White pawns on row 6 (rank 2)
+        board[1][i] = ('black', 'pawn')  # Black pawns on row 1 (rank 7)
+    
+    # Set up other pieces
+    pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook']
+    for i in range(BOARD_SIZE):
+        board[7][i] = ('white', pieces[i])  # White pieces on rank 1
+        board[0][i] = ('black', pieces[i])  # Black pieces on rank 8
+    
+    return board
+ 
+def make_move(board, start_pos, end_pos, promotion=None):
+    """Apply a move in place and return the captured piece ('' if none)"""
+    piece = board[start_pos[0]][start_pos[1]]
+    captured_piece = board[end_pos[0]][end_pos[1]]
+    board[end_pos[0]][end_pos[1]] = (piece[0], promotion) if promotion else piece
+    board[start_pos[0]][start_pos[1]] = ''
+    return captured_piece
+ 
+def make_move_with_stats(board, start_pos, end_pos, promotion, mover_stats, opponent_stats):
+    """make_move that also updates both players' stats; returns the captured piece
+
+    The stats see the pawn arrive before it is promoted, as in a game played on the board.
+    """
+    captured_piece = make_move(board, start_pos, end_pos)
+    mover_stats.update_stats(board, start_pos, end_pos, captured_piece)
+    opponent_stats.observe_opponent_move(end_pos, captured_piece)
+    if promotion:
+        board[end_pos[0]][end_pos[1]] = (mover_stats.color, promotion)
+        mover_stats.record_promotion(end_pos)
+    return captured_piece
+ 
+def square_name(pos):
+    """Algebraic name of a (row, col) square, e.g. 'e4'"""
+    row, col = pos
+    return 'abcdefgh'[col] + str(BOARD_SIZE - row)
+ 
+def parse_square(name):
+    """(row, col) of an algebraic square name"""
+    return BOARD_SIZE - int(name[1]), 'abcdefgh'.index(name[0])
+ 
+def square_index(pos):
+    """Index 0-63 of a (row, col) square counting from a1"""
+    row, col = pos
+    return (BOARD_SIZE - 1 - row) * BOARD_SIZE + col
+ 
+def index_square(index):
+    """(row, col) of a square index produced by square_index"""
+    rank, col = divmod(index, BOARD_SIZE)
+    return BOARD_SIZE - 1 - rank, col
+ 
+# Zobrist keys: a random 64-bit key per piece on each square index and one for black to move
+zobrist_random = random.Random(20240607)
+ZOBRIST_PIECES = {(color, piece): [zobrist_random.getrandbits(64) for _ in range(BOARD_SIZE * BOARD_SIZE)]
+                  for color in ('white', 'black') for piece in PIECE_VALUES}
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ 
+def position_hash(board, color):
+    """Zobrist hash of the position with color to move"""
+    position = ZOBRIST_BLACK_TO_MOVE if color == 'black' else 0
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            piece = board[row][col]
+            if piece:
+                position ^= ZOBRIST_PIECES[piece][square_index((row, col))]
+    return position
+ 
+def hash_after_move(position, board, start_pos, end_pos, promotion=None):
+    """Update a position hash for a move on the board before it is played"""
+    piece = board[start_pos[0]][start_pos[1]]
+    captured_piece = board[end_pos[0]][end_pos[1]]
+    start_index = square_index(start_pos)
+    end_index = square_index(end_pos)
+    position ^= ZOBRIST_PIECES[piece][start_index] ^ ZOBRIST_BLACK_TO_MOVE
+    position ^= ZOBRIST_PIECES[(piece[0], promotion) if promotion else piece][end_index]
+    if captured_piece:
+        position ^= ZOBRIST_PIECES[captured_piece][end_index]
+    return position
+ 
+class PositionHistory:
+    """Stack of position hashes since the start of the game, with the halfmove clock of each"""
+    def __init__(self, board, color):
+        self.hashes = [position_hash(board, color)]
+        self.clocks = [0]  # Plies since the last capture or pawn move
+    
+    def push(self, position, irreversible):
+        self.hashes.append(position)
+        self.clocks.append(0 if irreversible else self.clocks[-1] + 1)
+    
+    def push_move(self, board, start_pos, end_pos, promotion=None):
+        """Push the position after a move on the board before it is played"""
+        irreversible = board[start_pos[0]][start_pos[1]][1] == 'pawn' or bool(board[end_pos[0]][end_pos[1]])
+        self.push(hash_after_move(self.hashes[-1], board, start_pos, end_pos, promotion), irreversible)
+    
+    def pop(self):
+        self.hashes.pop()
+        self.clocks.pop()
+    
+    def copy(self):
+        """Independent copy, e.g. for a search running alongside the game"""
+        history = copy.copy(self)
+        history.hashes = self.hashes[:]
+        history.clocks = self.clocks[:]
+        return history
+    
+    def repetitions(self):
+        """Earlier occurrences of the current position, same side to move, since the last irreversible move"""
+        current = self.hashes[-1]
+        last = len(self.hashes) - 1
+        return sum(1 for i in range(last - 2, last - self.clocks[-1] - 1, -2) if self.hashes[i] == current)
+    
+    def is_draw(self, repetitions=2):
+        """Fifty-move rule, or the current position seen `repetitions` times before (threefold by default)"""
+        return self.clocks[-1] >= FIFTY_MOVE_PLIES or self.repetitions() >= repetitions
+ 
+# Set CHESS_PARAMS to a parameter file to play with tuned weights; loaded last, once the
+# evaluation caches it clears exist
+if os.environ.get('CHESS_PARAMS'):
+    load_parameters(os.environ['CHESS_PARAMS'])
@@ -0,0 +1,189 @@
+"""Compact binary game archive with a memory-mapped offset index
+
+An archive is two files:
+  <name>.cga      magic header followed by games, each a fixed-size header plus 16-bit moves
+  <name>.cga.idx  little-endian uint64 offset of every game in the .cga file
+Player names are stored once in <name>.cga.players, one per line, and games refer to them by id.
+
+Moves are encoded as from-square | to-square << 6 | promotion << 12, with squares counted from a1.
+"""
+import argparse
+import collections
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from chess_engine import create_board, make_move, square_index, index_square
+
+MAGIC = b'CGA\x01'
+FILE_HEADER = struct.Struct('<4sI')  # Magic, reserved
+GAME_HEADER = struct.Struct('<IIIHBB')  # White id, black id, date (YYYYMMDD), move count, result, reserved
+OFFSET = struct.Struct('<Q')
+RESULT_CODES = {'*': 0, '1-0': 1, '0-1': 2, '1/2-1/2': 3}
+RESULT_NAMES = {code: result for result, code in RESULT_CODES.items()}
+PROMOTION_CODES = {None: 0, 'knight': 1, 'bishop': 2, 'rook': 3, 'queen': 4}
+PROMOTION_PIECES = {code: piece for piece, code in PROMOTION_CODES.items()}
+
+# One archived game; moves is a zero-copy uint16 view into the mapped archive
+ArchivedGame = collections.namedtuple('ArchivedGame', ['white', 'black', 'date', 'result', 'moves'])
+
+def encode_move(start, end, promotion=None):
+    return square_index(start) | square_index(end) << 6 | PROMOTION_CODES[promotion] << 12
+
+def decode_move(code):
+    """(start, end, promotion) in board coordinates for an encoded move; raises ValueError on an invalid code"""
+    code = int(code)
+    if not 0 <= code < 1 << 15 or code >> 12 not in PROMOTION_PIECES:
+        raise ValueError(f"Invalid move code: {code}")
+    return index_square(code & 0x3F), index_square(code >> 6 & 0x3F), PROMOTION_PIECES[code >> 12]
+
+def decode_moves(codes):
+    return [decode_move(code) for code in codes]
+
+class ArchiveWriter:
+    """Appends games to an archive, creating it if needed"""
+    def __init__(self, path):
+        self.path = path
+        new_archive = not os.path.exists(path)
+        self.data = open(path, 'ab')
+        self.index = open(path + '.idx', 'ab')
+        if new_archive:
+            self.data.write(FILE_HEADER.pack(MAGIC, 0))
+        
+        self.player_ids = {}
+        if os.path.exists(path + '.players'):
+            with open(path + '.players', encoding='utf-8') as f:
+                for player_id, name in enumerate(f):
+                    self.player_ids[name.rstrip('\n')] = player_id
+        self.players = open(path + '.players', 'a', encoding='utf-8')
+    
+    def player_id(self, name):
+        name = name.replace('\n', ' ')
+        if name not in self.player_ids:
+            self.player_ids[name] = len(self.player_ids)
+            self.players.write(name + '\n')
+        return self.player_ids[name]
+    
+    def add_game(self, moves, white='?', black='?', result='*', date=0):
+        """Append one game; moves are (start, end, promotion) tuples in board coordinates"""
+        codes = np.array([encode_move(*move) for move in moves], dtype='<u2')
+        self.index.write(OFFSET.pack(self.data.tell()))
+        self.data.write(GAME_HEADER.pack(self.player_id(white), self.player_id(black), date,
+                                         len(codes), RESULT_CODES.get(result, 0), 0))
+        self.data.write(codes.tobytes())
+    
+    def close(self):
+        self.data.close()
+        self.index.close()
+        self.players.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+class GameArchive:
+    """Read-only view of an archive through mmap; game N is found in O(1) from the index"""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _ = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game archive")
+        
+        with open(path + '.idx', 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.offsets = np.frombuffer(self.index, dtype='<u8')
+        
+        with open(path + '.players', encoding='utf-8') as f:
+            self.player_names = [name.rstrip('\n') for name in f]
+    
+    def __len__(self):
+        return len(self.offsets)
+    
+    def __getitem__(self, n):
+        offset = int(self.offsets[n])
+        white_id, black_id, date, move_count, result, _ = GAME_HEADER.unpack_from(self.data, offset)
+        moves = np.frombuffer(self.data, dtype='<u2', count=move_count, offset=offset + GAME_HEADER.size)
+        return ArchivedGame(self.player_names[white_id], self.player_names[black_id], date,
+                            RESULT_NAMES[result], moves)
+    
+    def __iter__(self):
+        # Walk the data file sequentially instead of going through the index
+        offset = FILE_HEADER.size
+        end = len(self.data)
+        while offset < end:
+            white_id, black_id, date, move_count, result, _ = GAME_HEADER.unpack_from(self.data, offset)
+            moves_offset = offset + GAME_HEADER.size
+            moves = np.frombuffer(self.data, dtype='<u2', count=move_count, offset=moves_offset)
+            yield ArchivedGame(self.player_names[white_id], self.player_names[black_id], date,
+                               RESULT_NAMES[result], moves)
+            offset = moves_offset + 2 * move_count
+    
+    def close(self):
+        # Views handed out by __getitem__ keep the maps alive until they are released
+        self.offsets = None
+        try:
+            self.data.close()
+            if self.index:
+                self.index.close()
+        except BufferError:
+            pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def import_pgn(pgn_path, archive_path):
+    """Convert a PGN file into an archive, streaming game by game; returns (imported, skipped)"""
+    from pgn import read_games, san_to_move
+    
+    imported = skipped = 0
+    with ArchiveWriter(archive_path) as writer:
+        for game in read_games(pgn_path):
+            board = create_board()
+            color = 'white'
+            moves = []
+            try:
+                for san in game.moves:
+                    move = san_to_move(board, san, color)
+                    make_move(board, *move)
+                    moves.append(move)
+                    color = 'black' if color == 'white' else 'white'
+            except ValueError:
+                skipped += 1
+                continue
+            date = game.headers.get('Date', '').replace('.', '')
+            writer.add_game(moves, game.headers.get('White', '?'), game.headers.get('Black', '?'),
+                            game.result, int(date) if date.isdigit() else 0)
+            imported += 1
+    return imported, skipped
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect binary game archives")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="append the games of a PGN file to an archive")
+    import_parser.add_argument('pgn')
+    import_parser.add_argument('archive')
+    info_parser = commands.add_parser('info', help="print archive statistics")
+    info_parser.add_argument('archive')
+    args = parser.parse_args(argv)
+    
+    if args.command == 'import':
+        imported, skipped = import_pgn(args.pgn, args.archive)
+        print(f"Imported {imported} games, skipped {skipped} with unsupported moves")
+    else:
+        with GameArchive(args.archive) as archive:
+            total_moves = sum(len(game.moves) for game in archive)
+            print(f"{len(archive)} games, {total_moves} moves, {len(archive.player_names)} players")
+
+if __name__ == '__main__':
+    sys.exit(main())
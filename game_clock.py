@@ -0,0 +1,93 @@
+"""Chess clocks with increment, and per-move thinking time for the engine
+
+Only the clock of the side to move runs; press() stops it, adds the increment and starts
+the opponent's. allocate_time splits the remaining time into a soft budget, after which
+the search starts no new iteration, and a hard budget, at which it abandons the one in
+progress:
+
+    soft, hard = allocate_time(clock.remaining('black'), clock.increment, moves_played, len(moves))
+    score, move, stats = search(board, depth, False, soft_limit=soft, hard_limit=hard)
+"""
+import math
+import time
+
+MOVE_OVERHEAD = 0.1  # Seconds per move kept back for drawing the board and handling events
+EXPECTED_GAME_MOVES = 60  # Time is spread as if the game lasts this many moves...
+MIN_MOVES_TO_GO = 20  # ...but always over at least this many more
+TYPICAL_MOVE_COUNT = 30  # Legal moves in an ordinary middlegame position
+HARD_LIMIT_FACTOR = 4  # How far past the soft budget a single search may run
+MAX_TIME_FRACTION = 0.25  # Largest share of the remaining time one move may use
+LOW_TIME_SECONDS = 10  # Below this the clock shows tenths of a second
+
+def parse_time_control(text):
+    """(base, increment) from 'base+increment'; raises ValueError unless both are finite and not negative"""
+    base, _, increment = text.partition('+')
+    base, increment = float(base), float(increment or 0)
+    if not (math.isfinite(base) and math.isfinite(increment)) or base < 0 or increment < 0:
+        raise ValueError(f"Invalid time control: {text}")
+    return base, increment
+
+def format_clock(seconds):
+    """m:ss, or seconds with tenths when time is low"""
+    seconds = max(seconds, 0)
+    if seconds < LOW_TIME_SECONDS:
+        return f"{seconds:.1f}"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def allocate_time(remaining, increment, moves_played, move_count, in_check=False):
+    """(soft, hard) seconds for the next move
+
+    The base share is the usable time over the moves still expected, plus most of the
+    increment. Positions with many legal moves or a check get more, forced ones less.
+    The hard budget never exceeds MAX_TIME_FRACTION of what is left, so the engine
+    cannot lose on time as long as each search stops at it.
+    """
+    usable = max(remaining - MOVE_OVERHEAD, 0)
+    moves_to_go = max(MIN_MOVES_TO_GO, EXPECTED_GAME_MOVES - moves_played)
+    soft = usable / moves_to_go + increment * 0.75
+    if move_count <= 1:
+        soft = 0
+    else:
+        soft *= min(max(move_count / TYPICAL_MOVE_COUNT, 0.5), 1.5) * (1.25 if in_check else 1)
+    hard = min(soft * HARD_LIMIT_FACTOR, usable * MAX_TIME_FRACTION)
+    return min(soft, hard), hard
+
+class GameClock:
+    """Remaining time of both players under a base+increment time control"""
+    def __init__(self, base, increment):
+        self.increment = increment
+        self.times = {'white': base, 'black': base}
+        self.running = None  # Color whose clock is running
+        self.started = 0.0
+    
+    def start(self, color):
+        self.stop()
+        self.running = color
+        self.started = time.monotonic()
+    
+    def stop(self):
+        if self.running is not None:
+            self.times[self.running] -= time.monotonic() - self.started
+            self.running = None
+    
+    def press(self):
+        """End the running side's move: stop its clock, add the increment, start the opponent's"""
+        color = self.running
+        if color is None:
+            return
+        self.stop()
+        self.times[color] += self.increment
+        self.start('black' if color == 'white' else 'white')
+    
+    def remaining(self, color):
+        if color == self.running:
+            return self.times[color] - (time.monotonic() - self.started)
+        return self.times[color]
+    
+    def flagged(self):
+        """Color that has run out of time, or None"""
+        for color in ('white', 'black'):
+            if self.remaining(color) <= 0:
+                return color
+        return None
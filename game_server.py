@@ -0,0 +1,272 @@
+"""Asyncio server hosting many independent games in one process
+
+Clients connect over TCP or a Unix socket and exchange one JSON object per line. Every
+request gets exactly one reply, echoing its "id" if one was given:
+
+    {"op": "new", "white": "Ann", "black": "AI", "ai": "black", "level": "medium"}
+        -> {"ok": true, "game": 1, "turn": "white", "status": "playing", "board": [...], ...}
+    {"op": "move", "game": 1, "move": "e2e4"}
+        -> {"ok": true, "game": 1, "ai_move": "e7e5", "turn": "white", ...}
+    {"op": "state", "game": 1}     {"op": "go", "game": 1}     {"op": "close", "game": 1}
+    {"op": "stats"}
+
+Moves are UCI strings; a pawn reaching the last rank without a promotion letter becomes a
+queen. Engine moves run on a shared process pool. At most --queue-limit searches are in
+flight; further requests wait, and their connections stop being read until a slot frees
+up. A failed search gets an error reply and leaves the game as it was. Games belong to
+the connection that created them and end when it disconnects.
+
+    python game_server.py --port 8765 --workers 4
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+
+from chess_engine import (BOARD_SIZE, FIFTY_MOVE_PLIES, STRENGTH_LEVELS, PositionHistory, choose_move_at_level,
+                          create_board, flush_analysis_cache, get_valid_moves, is_checkmate, is_stalemate, make_move,
+                          search)
+from pgn import PIECE_LETTERS, move_to_uci, uci_to_move
+
+AI_DEPTHS = {'hard': 3}  # Search depth of the levels not in STRENGTH_LEVELS
+MAX_LINE = 4096  # Longest request line accepted, in bytes
+
+class EngineError(Exception):
+    """An engine search failed; the game is kept and the client may retry with 'go'"""
+
+def board_rows(board):
+    """Board as 8 strings from the top row, uppercase for white, '.' for an empty square"""
+    rows = []
+    for row in board:
+        letters = ''
+        for piece in row:
+            letter = PIECE_LETTERS.get(piece[1], 'P') if piece else '.'
+            letters += letter if not piece or piece[0] == 'white' else letter.lower()
+        rows.append(letters)
+    return rows
+
+def promotes(board, start, end):
+    return board[start[0]][start[1]][1] == 'pawn' and end[0] in (0, BOARD_SIZE - 1)
+
+def engine_move(board, color, level, history):
+    """Pick a move for color; runs in a worker process. Returns (start, end, promotion) or None"""
+    if level in STRENGTH_LEVELS:
+        move = choose_move_at_level(board, color, level, history=history)
+    else:
+        _, move, _ = search(board, AI_DEPTHS[level], color == 'white', history=history)
+        # Pool workers never run atexit handlers
+        flush_analysis_cache()
+    if move is None:
+        return None
+    start, end = move
+    return start, end, 'queen' if promotes(board, start, end) else None
+
+class GameSession:
+    """One game: board, side to move, played moves and an optional engine side"""
+    def __init__(self, game_id, white, black, ai_color=None, level='medium'):
+        self.game_id = game_id
+        self.white = white
+        self.black = black
+        self.ai_color = ai_color
+        self.level = level
+        self.board = create_board()
+        self.turn = 'white'
+        self.history = PositionHistory(self.board, self.turn)
+        self.moves = []
+        self.status = 'playing'
+        self.thinking = False
+    
+    def play(self, start, end, promotion=None):
+        """Validate and apply a move for the side to move; raises ValueError"""
+        if self.status != 'playing':
+            raise ValueError(f"Game is over ({self.status})")
+        piece = self.board[start[0]][start[1]]
+        if not piece or piece[0] != self.turn:
+            raise ValueError(f"No {self.turn} piece on the start square")
+        if end not in get_valid_moves(self.board, start, piece):
+            raise ValueError("Illegal move")
+        if promotes(self.board, start, end):
+            promotion = promotion or 'queen'
+        elif promotion:
+            raise ValueError("Only a pawn reaching the last rank can promote")
+        
+        self.history.push_move(self.board, start, end, promotion)
+        make_move(self.board, start, end, promotion)
+        self.moves.append(move_to_uci(start, end, promotion))
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        if is_checkmate(self.board, self.turn):
+            self.status = 'checkmate'
+        elif is_stalemate(self.board, self.turn):
+            self.status = 'stalemate'
+        elif self.history.is_draw():
+            self.status = 'fifty moves' if self.history.clocks[-1] >= FIFTY_MOVE_PLIES else 'repetition'
+    
+    def to_dict(self):
+        return {'game': self.game_id, 'white': self.white, 'black': self.black, 'turn': self.turn,
+                'status': self.status, 'moves': self.moves, 'board': board_rows(self.board)}
+
+class GameServer:
+    def __init__(self, workers, queue_limit, max_sessions):
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        self.max_sessions = max_sessions
+        self.workers = workers
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers)
+        self.engine_slots = asyncio.Semaphore(queue_limit)
+        self.engine_waiting = 0
+        self.engine_running = 0
+    
+    async def engine_play(self, session):
+        """Let the engine move for the side to move; returns its UCI move or None"""
+        session.thinking = True
+        self.engine_waiting += 1
+        try:
+            async with self.engine_slots:
+                self.engine_waiting -= 1
+                self.engine_running += 1
+                executor = self.executor
+                try:
+                    loop = asyncio.get_running_loop()
+                    move = await loop.run_in_executor(executor, engine_move, session.board,
+                                                      session.turn, session.level, session.history)
+                except concurrent.futures.process.BrokenProcessPool:
+                    # A worker died and the pool refuses all work from now on, so replace it once
+                    if self.executor is executor:
+                        executor.shutdown(wait=False)
+                        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+                    raise EngineError("Engine worker crashed, try 'go' again")
+                except Exception as e:
+                    raise EngineError(f"Engine failed: {e!r}") from e
+                finally:
+                    self.engine_running -= 1
+        finally:
+            session.thinking = False
+        if move is None or session.game_id not in self.sessions:
+            return None
+        session.play(*move)
+        return session.moves[-1]
+    
+    def session_for(self, request, owned):
+        game_id = request.get('game')
+        if not isinstance(game_id, int) or game_id not in owned:
+            raise ValueError(f"Unknown game: {game_id}")
+        session = self.sessions[game_id]
+        if session.thinking:
+            raise ValueError("Engine is still thinking")
+        return session
+    
+    async def dispatch(self, request, owned):
+        op = request.get('op')
+        if op == 'new':
+            if len(self.sessions) >= self.max_sessions:
+                raise ValueError("Server is full")
+            level = request.get('level', 'medium')
+            ai_color = request.get('ai')
+            if level not in AI_DEPTHS and level not in STRENGTH_LEVELS:
+                raise ValueError(f"Unknown level: {level}")
+            if ai_color not in ('white', 'black', None):
+                raise ValueError(f"Unknown ai color: {ai_color}")
+            session = GameSession(next(self.game_ids), request.get('white', '?'), request.get('black', '?'),
+                                  ai_color, level)
+            self.sessions[session.game_id] = session
+            owned.add(session.game_id)
+            reply = {}
+            if ai_color == 'white':
+                reply['ai_move'] = await self.engine_play(session)
+            return dict(reply, **session.to_dict())
+        if op == 'move':
+            session = self.session_for(request, owned)
+            if session.turn == session.ai_color:
+                raise ValueError("It is the engine's turn")
+            session.play(*uci_to_move(str(request.get('move', ''))))
+            reply = {}
+            if session.ai_color == session.turn and session.status == 'playing':
+                reply['ai_move'] = await self.engine_play(session)
+            return dict(reply, **session.to_dict())
+        if op == 'go':
+            session = self.session_for(request, owned)
+            if session.status != 'playing':
+                raise ValueError(f"Game is over ({session.status})")
+            return dict({'ai_move': await self.engine_play(session)}, **session.to_dict())
+        if op == 'state':
+            return self.session_for(request, owned).to_dict()
+        if op == 'close':
+            game_id = self.session_for(request, owned).game_id
+            owned.discard(game_id)
+            del self.sessions[game_id]
+            return {'game': game_id}
+        if op == 'stats':
+            return {'sessions': len(self.sessions), 'engine_running': self.engine_running,
+                    'engine_waiting': self.engine_waiting}
+        raise ValueError(f"Unknown op: {op}")
+    
+    async def handle_client(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                request = {}
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    reply = {'ok': False, 'error': "Request line too long"}
+                    writer.write(json.dumps(reply).encode() + b'\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                    reply = dict(await self.dispatch(request, owned), ok=True)
+                except (ValueError, TypeError, EngineError) as e:
+                    request = request if isinstance(request, dict) else {}
+                    reply = {'ok': False, 'error': str(e)}
+                if 'id' in request:
+                    reply['id'] = request['id']
+                writer.write(json.dumps(reply).encode() + b'\n')
+                # Stop reading from a client that is not reading its replies
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in owned:
+                self.sessions.pop(game_id, None)
+            writer.close()
+    
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+async def serve(args):
+    server = GameServer(args.workers, args.queue_limit or 2 * args.workers, args.max_sessions)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle_client, args.unix, limit=MAX_LINE)
+        address = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle_client, args.host, args.port, limit=MAX_LINE)
+        address = f"{args.host}:{args.port}"
+    print(f"Serving games on {address} with {args.workers} engine workers", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many concurrent games over line-delimited JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--queue-limit', type=int, default=0, help="engine searches in flight (default: 2 per worker)")
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    sys.exit(main())
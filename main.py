@@ -1,17 +1,32 @@
 import pygame
 import sys
+import atexit
+import collections
+import concurrent.futures
+import cProfile
+import pstats
+import threading
 import random
 import time
 import math
+import os
+import numpy as np
+import net_play
+from chess_engine import (BOARD_SIZE, STRENGTH_LEVELS, PlayerStats, get_all_moves, get_valid_moves, is_in_check,
+                          is_checkmate, is_stalemate, choose_move_at_level, create_board, make_move_with_stats,
+                          position_hash, PositionHistory, hash_after_move, search)
+from game_archive import encode_move, decode_move
+from game_clock import GameClock, allocate_time, format_clock, parse_time_control
+from pgn import GameRecord
  
 # Initialize Pygame
 pygame.init()
  
 # Constants
 WINDOW_SIZE = 680
-BOARD_SIZE = 8
 SQUARE_SIZE = (WINDOW_SIZE - 100) // BOARD_SIZE  # Reduced square size to make room for player names
 BOARD_OFFSET_Y = 50  # Space for player names at top and bottom
+BOARD_OFFSET_X = (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2  # Centers the board horizontally
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 GRAY = (128, 128, 128)
@@ -20,6 +35,11 @@ GREEN = (0, 255, 0)
 HIGHLIGHT = (255, 255, 0, 128)
 VALID_MOVE = (0, 255, 0, 128)
 FPS = 60
+PGN_FILE = 'games.pgn'  # Finished and abandoned games are appended here
+IDLE_WAIT_MS = 500  # Longest time an idle screen sleeps before checking the game state again
+NET_POLL_MS = 50  # Idle sleep during network games, so opponent moves show up promptly
+CLOCK_POLL_MS = 100  # Idle sleep while a game clock runs, so it counts down smoothly
+CLOCK_WIDTH = 110  # Width of each clock box at the right end of the player bars
  
 # Colors for the board
 LIGHT_SQUARE = (240, 217, 181)
@@ -53,9 +73,8 @@ AI_SPEEDS = {
     'hard': {'move': 200, 'thinking': 1500}
 }
 
+# Search depth of the levels not in STRENGTH_LEVELS
 AI_DEPTH = {
-    'easy': 2,
-    'medium': 3,
     'hard': 4
 }
  
@@ -83,33 +102,51 @@ PIECES = {
     }
 }
  
-# Piece values for evaluation
-PIECE_VALUES = {
-    'pawn': 100,
-    'knight': 320,
-    'bishop': 330,
-    'rook': 500,
-    'queen': 900,
-    'king': 20000
-}
- 
-# Add these constants for skill measurement
-SKILL_METRICS = {
-    'piece_value': {
-        'pawn': 1,
-        'knight': 3,
-        'bishop': 3,
-        'rook': 5,
-        'queen': 9,
-        'king': 0
-    },
-    'position_bonus': {
-        'center_control': 2,  # Bonus for controlling center squares
-        'pawn_structure': 1,  # Bonus for good pawn structure
-        'piece_development': 1.5,  # Bonus for developing pieces early
-        'king_safety': 2  # Bonus for king safety
-    }
-}
+# Fonts used by the UI screens, loaded once at startup by warm_fonts()
+UI_FONTS = [
+    ('Arial', 20, False),
+    ('Arial', 24, False),
+    ('Arial', 28, False),
+    ('Arial', 32, False),
+    ('Arial', 32, True),
+    ('Arial', 36, False),
+    ('Arial', 36, True),
+    ('Arial', 42, True),
+    ('Arial', 48, False),
+    ('Arial', 64, True),
+    ('Arial', 72, True),
+    ('couriernew', 16, False),  # Frame profiler overlay
+    ('segoeuisymbol', int(SQUARE_SIZE * 0.8), False),
+    ('segoeuisymbol', 56, False),  # Pieces on the promotion buttons
+]
+TEXT_CACHE_LIMIT = 512  # Rendered labels kept before the text cache is cleared
+
+font_cache = {}
+text_cache = {}
+
+def get_font(family, size, bold=False):
+    """Return the font for (family, size, bold), looking it up only once"""
+    key = (family, size, bold)
+    font = font_cache.get(key)
+    if font is None:
+        font = pygame.font.SysFont(family, size, bold=bold)
+        font_cache[key] = font
+    return font
+
+def render_text(text, color, family, size, bold=False):
+    """Render antialiased text, reusing the surface for labels drawn every frame"""
+    key = (text, tuple(color), family, size, bold)
+    surface = text_cache.get(key)
+    if surface is None:
+        if len(text_cache) >= TEXT_CACHE_LIMIT:
+            text_cache.clear()
+        surface = get_font(family, size, bold).render(text, True, color)
+        text_cache[key] = surface
+    return surface
+
+def warm_fonts():
+    for family, size, bold in UI_FONTS:
+        get_font(family, size, bold)
 
 class TextInput:
     def __init__(self, x, y, width, height, default_text, label):
@@ -118,15 +155,14 @@ class TextInput:
         self.default_text = default_text
         self.label = label
         self.active = False
-        self.font = pygame.font.SysFont('Arial', 32)
-        self.label_font = pygame.font.SysFont('Arial', 24)
+        self.font = get_font('Arial', 32)
         self.cursor_visible = True
         self.cursor_timer = 0
         self.cursor_blink_speed = 500  # milliseconds
 
     def draw(self, surface):
         # Draw label above the input field
-        label_surface = self.label_font.render(self.label, True, MENU_TEXT_COLOR)
+        label_surface = render_text(self.label, MENU_TEXT_COLOR, 'Arial', 24)
         label_rect = label_surface.get_rect(bottomleft=(self.rect.left, self.rect.top - 5))
         surface.blit(label_surface, label_rect)
 
@@ -231,18 +267,16 @@ class Button:
         pygame.draw.rect(surface, border_color, animated_rect, 2, border_radius=12)
         
         # Draw text with enhanced visibility
-        font = pygame.font.SysFont('Arial', 36, bold=True)
-        
         # Draw multiple text shadows for better depth
         shadow_offsets = [(2, 2), (1, 1)]
         for offset_x, offset_y in shadow_offsets:
-            shadow_text = font.render(self.text, True, (20, 20, 30))
+            shadow_text = render_text(self.text, (20, 20, 30), 'Arial', 36, bold=True)
             shadow_rect = shadow_text.get_rect(center=(animated_rect.centerx + offset_x, 
                                                      animated_rect.centery + offset_y))
             surface.blit(shadow_text, shadow_rect)
         
         # Draw main text with better contrast
-        text_surface = font.render(self.text, True, MENU_TITLE_COLOR)
+        text_surface = render_text(self.text, MENU_TITLE_COLOR, 'Arial', 36, bold=True)
         text_rect = text_surface.get_rect(center=animated_rect.center)
         surface.blit(text_surface, text_rect)
  
@@ -271,162 +305,113 @@ class PromotionButton:
         
         # Draw piece with larger size and better positioning
         font_size = int(self.rect.height * 0.7)  # Piece takes up 70% of button height
-        font = pygame.font.SysFont('segoeuisymbol', font_size)
-        text = font.render(PIECES[self.color][self.piece_type], True, WHITE if self.color == 'white' else BLACK)
+        text = render_text(PIECES[self.color][self.piece_type], WHITE if self.color == 'white' else BLACK,
+                           'segoeuisymbol', font_size)
         text_rect = text.get_rect(center=self.rect.center)
         screen.blit(text, text_rect)
 
-class PlayerStats:
-    def __init__(self, color):
-        self.color = color
-        self.pieces_captured = []
-        self.moves_made = 0
-        self.center_control_moves = 0
-        self.pieces_developed = set()
-        self.check_moves = 0
-        self.pawn_structure_score = 0
-        self.king_safety_score = 0
-        
-    def update_stats(self, board, move_from, move_to, captured_piece=None):
-        self.moves_made += 1
-        
-        # Track captured pieces
-        if captured_piece:
-            self.pieces_captured.append(captured_piece)
-        
-        # Check for center control (squares e4, e5, d4, d5)
-        center_squares = [(3, 3), (3, 4), (4, 3), (4, 4)]
-        if move_to in center_squares:
-            self.center_control_moves += 1
-        
-        # Track piece development
-        piece = board[move_to[0]][move_to[1]]
-        if piece and piece[1] != 'pawn' and piece[1] != 'king':
-            self.pieces_developed.add((piece[1], move_from))
-        
-        # Update pawn structure score
-        self.update_pawn_structure(board)
-        
-        # Update king safety score
-        self.update_king_safety(board)
-    
-    def update_pawn_structure(self, board):
-        self.pawn_structure_score = 0
-        for col in range(BOARD_SIZE):
-            pawn_count = 0
-            for row in range(BOARD_SIZE):
-                piece = board[row][col]
-                if piece and piece[0] == self.color and piece[1] == 'pawn':
-                    pawn_count += 1
-            # Penalize doubled pawns, reward connected pawns
-            if pawn_count > 1:
-                self.pawn_structure_score -= 1
-            elif pawn_count == 1:
-                self.pawn_structure_score += 1
-    
-    def update_king_safety(self, board):
-        # Find king position
-        king_pos = None
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board[row][col]
-                if piece and piece[0] == self.color and piece[1] == 'king':
-                    king_pos = (row, col)
-                    break
-            if king_pos:
-                break
-        
-        if king_pos:
-            # Check pawns in front of king
-            self.king_safety_score = 0
-            row, col = king_pos
-            pawn_shield = 0
-            for r in range(max(0, row-1), min(BOARD_SIZE, row+2)):
-                for c in range(max(0, col-1), min(BOARD_SIZE, col+2)):
-                    piece = board[r][c]
-                    if piece and piece[0] == self.color and piece[1] == 'pawn':
-                        pawn_shield += 1
-            self.king_safety_score = pawn_shield * 0.5
-
-    def calculate_skill_rating(self):
-        # Base score starts at 1000
-        score = 1000
-        
-        # Add points for captured pieces
-        for piece in self.pieces_captured:
-            score += SKILL_METRICS['piece_value'][piece[1]] * 10
-        
-        # Add points for center control
-        score += self.center_control_moves * SKILL_METRICS['position_bonus']['center_control'] * 15
-        
-        # Add points for piece development
-        score += len(self.pieces_developed) * SKILL_METRICS['position_bonus']['piece_development'] * 20
-        
-        # Add points for pawn structure
-        score += self.pawn_structure_score * SKILL_METRICS['position_bonus']['pawn_structure'] * 10
-        
-        # Add points for king safety
-        score += self.king_safety_score * SKILL_METRICS['position_bonus']['king_safety'] * 15
-        
-        # Add bonus for checkmate
-        if self.check_moves > 0:
-            score += self.check_moves * 25
-        
-        return int(score)
-
-class Firework:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.size = 1
-        self.particles = []
-        self.alive = True
-        self.color = (
+class FireworkSystem:
+    """Particles of every firework on screen, stored in flat NumPy arrays"""
+    PARTICLES_PER_FIREWORK = 30
+    
+    def __init__(self):
+        self.positions = np.empty((0, 2), dtype=np.float32)
+        self.velocities = np.empty((0, 2), dtype=np.float32)
+        self.alphas = np.empty(0, dtype=np.float32)
+        self.colors = np.empty((0, 3), dtype=np.float32)
+        
+        # Pre-render the particle sprite once and keep the pixels it covers
+        sprite = pygame.Surface((4, 4), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, (255, 255, 255, 255), (2, 2), 2)
+        self.sprite_offsets = np.argwhere(pygame.surfarray.array_alpha(sprite) > 0)
+    
+    def launch(self, x, y):
+        count = self.PARTICLES_PER_FIREWORK
+        angles = np.random.uniform(0, 2 * math.pi, count)
+        speeds = np.random.uniform(2, 6, count)
+        color = (
             random.randint(50, 255),
             random.randint(50, 255),
             random.randint(50, 255)
         )
-        self.create_particles()
-    
-    def create_particles(self):
-        num_particles = 30
-        for _ in range(num_particles):
-            angle = random.uniform(0, 2 * 3.14159)
-            speed = random.uniform(2, 6)
-            dx = math.cos(angle) * speed
-            dy = math.sin(angle) * speed
-            self.particles.append({
-                'x': self.x,
-                'y': self.y,
-                'dx': dx,
-                'dy': dy,
-                'alpha': 255
-            })
+        self.positions = np.concatenate([self.positions, np.tile(np.float32((x, y)), (count, 1))])
+        self.velocities = np.concatenate([self.velocities,
+                                          np.stack([np.cos(angles) * speeds, np.sin(angles) * speeds], axis=1).astype(np.float32)])
+        self.alphas = np.concatenate([self.alphas, np.full(count, 255, dtype=np.float32)])
+        self.colors = np.concatenate([self.colors, np.tile(np.float32(color), (count, 1))])
     
     def update(self):
-        for particle in self.particles:
-            particle['x'] += particle['dx']
-            particle['y'] += particle['dy']
-            particle['dy'] += 0.1  # Gravity
-            particle['alpha'] = max(0, particle['alpha'] - 3)
+        self.positions += self.velocities
+        self.velocities[:, 1] += 0.1  # Gravity
+        self.alphas -= 3
         
         # Remove dead particles
-        self.particles = [p for p in self.particles if p['alpha'] > 0]
-        if not self.particles:
-            self.alive = False
+        alive = self.alphas > 0
+        self.positions = self.positions[alive]
+        self.velocities = self.velocities[alive]
+        self.alphas = self.alphas[alive]
+        self.colors = self.colors[alive]
     
     def draw(self, screen):
-        for particle in self.particles:
-            surface = pygame.Surface((4, 4), pygame.SRCALPHA)
-            pygame.draw.circle(surface, (*self.color, particle['alpha']), (2, 2), 2)
-            screen.blit(surface, (particle['x'] - 2, particle['y'] - 2))
+        if not len(self.alphas):
+            return
+        
+        # Expand every particle into the screen pixels its sprite covers
+        corners = (self.positions - 2).astype(np.int32)
+        xs = (corners[:, 0, None] + self.sprite_offsets[:, 0]).ravel()
+        ys = (corners[:, 1, None] + self.sprite_offsets[:, 1]).ravel()
+        pixel_count = len(self.sprite_offsets)
+        alphas = np.repeat(self.alphas / 255, pixel_count)[:, None]
+        colors = np.repeat(self.colors, pixel_count, axis=0)
+        
+        width, height = screen.get_size()
+        visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        xs, ys, alphas, colors = xs[visible], ys[visible], alphas[visible], colors[visible]
+        
+        # Alpha blend all particles into the screen in one step
+        pixels = pygame.surfarray.pixels3d(screen)
+        background = pixels[xs, ys].astype(np.float32)
+        pixels[xs, ys] = (background + (colors - background) * alphas).astype(np.uint8)
+        del pixels  # Unlock the screen surface
 
-def get_player_name(title):
+class DirtyRegions:
+    """Collects the screen areas that changed since the last display update"""
+    def __init__(self):
+        self.rects = []
+        self.full_redraw = True  # The first frame always pushes the whole window
+    
+    def mark(self, rect):
+        self.rects.append(pygame.Rect(rect))
+    
+    def mark_square(self, pos):
+        if pos is not None:
+            self.mark(get_square_rect(pos))
+    
+    def mark_squares(self, positions):
+        for pos in positions or []:
+            self.mark_square(pos)
+    
+    def mark_all(self):
+        self.full_redraw = True
+    
+    def needs_redraw(self):
+        return self.full_redraw or bool(self.rects)
+    
+    def update(self):
+        # Push only the changed areas to the display
+        if self.full_redraw:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects = []
+        self.full_redraw = False
+
+def get_player_name(title, prompt="Enter Player Name", error=None):
+    """Text typed on a name-entry screen, or None for Back; error is shown under the field"""
     clock = pygame.time.Clock()
     
     # Draw subtitle
-    font_subtitle = pygame.font.SysFont('Arial', 36, bold=True)
-    subtitle = font_subtitle.render("Enter Player Name", True, MENU_TEXT_COLOR)
+    subtitle = render_text(prompt, MENU_TEXT_COLOR, 'Arial', 36, bold=True)
     subtitle_rect = subtitle.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE//2 - 80))
     screen.blit(subtitle, subtitle_rect)
     
@@ -439,7 +424,7 @@ def get_player_name(title):
         input_width,
         input_height,
         "",
-        "Enter Player Name"  # Changed default text
+        prompt
     )
     
     # Create back and next buttons
@@ -457,27 +442,27 @@ def get_player_name(title):
             pygame.draw.line(screen, (35, 35, 45), (MENU_MARGIN, i), (WINDOW_SIZE - MENU_MARGIN, i))
         
         # Draw title with shadow effect
-        font_title = pygame.font.SysFont('Arial', 72, bold=True)
-        
         # Multiple shadow layers for depth
         for offset in range(4, 0, -1):
-            shadow = font_title.render("Chess Game", True, (0, 0, 0))
+            shadow = render_text("Chess Game", (0, 0, 0), 'Arial', 72, bold=True)
             shadow_rect = shadow.get_rect(center=(WINDOW_SIZE // 2 + offset, 120 + offset))
             screen.blit(shadow, shadow_rect)
         
         # Main title
-        title = font_title.render("Chess Game", True, MENU_TITLE_COLOR)
+        title = render_text("Chess Game", MENU_TITLE_COLOR, 'Arial', 72, bold=True)
         title_rect = title.get_rect(center=(WINDOW_SIZE // 2, 120))
         screen.blit(title, title_rect)
         
         # Draw subtitle
-        font_subtitle = pygame.font.SysFont('Arial', 36, bold=True)
-        subtitle = font_subtitle.render("Enter Player Name", True, MENU_TEXT_COLOR)  # Fixed subtitle text
+        subtitle = render_text(prompt, MENU_TEXT_COLOR, 'Arial', 36, bold=True)
         subtitle_rect = subtitle.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE//2 - 80))
         screen.blit(subtitle, subtitle_rect)
         
         # Draw input field and buttons
         input_field.draw(screen)
+        if error:
+            error_text = render_text(error, RED, 'Arial', 24)
+            screen.blit(error_text, error_text.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE//2 + 60)))
         back_button.draw(screen)
         if input_field.text and input_field.text != input_field.default_text:
             next_button.draw(screen)
@@ -522,8 +507,7 @@ def get_ai_difficulty():
     center_y = WINDOW_SIZE // 2
     
     # Draw subtitle
-    font_subtitle = pygame.font.SysFont('Arial', 36, bold=True)
-    subtitle = font_subtitle.render("Select Difficulty", True, MENU_TEXT_COLOR)
+    subtitle = render_text("Select Difficulty", MENU_TEXT_COLOR, 'Arial', 36, bold=True)
     subtitle_rect = subtitle.get_rect(center=(WINDOW_SIZE // 2, 200))  # Fixed position
     screen.blit(subtitle, subtitle_rect)
     
@@ -563,16 +547,14 @@ def get_ai_difficulty():
             pygame.draw.line(screen, (35, 35, 45), (MENU_MARGIN, i), (WINDOW_SIZE - MENU_MARGIN, i))
         
         # Draw title with shadow effect
-        font_title = pygame.font.SysFont('Arial', 72, bold=True)
-        
         # Multiple shadow layers for depth
         for offset in range(4, 0, -1):
-            shadow = font_title.render("Chess Game", True, (0, 0, 0))
+            shadow = render_text("Chess Game", (0, 0, 0), 'Arial', 72, bold=True)
             shadow_rect = shadow.get_rect(center=(WINDOW_SIZE // 2 + offset, 120 + offset))
             screen.blit(shadow, shadow_rect)
         
         # Main title
-        title = font_title.render("Chess Game", True, MENU_TITLE_COLOR)
+        title = render_text("Chess Game", MENU_TITLE_COLOR, 'Arial', 72, bold=True)
         title_rect = title.get_rect(center=(WINDOW_SIZE // 2, 120))
         screen.blit(title, title_rect)
        
@@ -621,6 +603,20 @@ def get_ai_difficulty():
         
         clock.tick(FPS)
 
+def get_time_control():
+    """(base seconds, increment seconds) typed as minutes+increment, (0, 0) for no clock; None to go back"""
+    error = None
+    while True:
+        text = get_player_name("Clock", "Time control, e.g. 5+3 (0 = none)", error)
+        if text is None:
+            return None
+        try:
+            minutes, increment = parse_time_control(text.strip())
+        except ValueError:
+            error = f"Not a time control: {text.strip()[:20]}"
+            continue
+        return minutes * 60, increment
+
 def menu_loop():
     clock = pygame.time.Clock()
     
@@ -629,6 +625,18 @@ def menu_loop():
         game_mode = game_mode_selection_loop()
         if game_mode is None:
             continue
+        
+        # Network games: the host plays white, each side sees its own pieces at the bottom, and there is no clock
+        if game_mode == "LAN":
+            player_name = get_player_name("Player")
+            if player_name is None:
+                continue
+            net_address = get_player_name("Opponent", "Host address, or 'host' to host")
+            if net_address is None:
+                continue
+            if net_address.strip().lower() == 'host':
+                return game_mode, None, player_name, "Waiting for opponent...", True, None, None
+            return game_mode, None, "Connecting...", player_name, False, net_address.strip(), None
             
         # Get side selection
         is_white = side_selection_loop()
@@ -643,15 +651,21 @@ def menu_loop():
             player2_name = get_player_name("Player 2")
             if player2_name is None:
                 continue
-            return game_mode, None, player1_name, player2_name, is_white
+            time_control = get_time_control()
+            if time_control is None:
+                continue
+            return game_mode, None, player1_name, player2_name, is_white, None, time_control
         else:  # AI mode
             player_name = get_player_name("Player")
             if player_name is None:
                 continue
+            time_control = get_time_control()
+            if time_control is None:
+                continue
             ai_speed = get_ai_difficulty()
             if ai_speed is None:
                 continue
-            return game_mode, ai_speed, player_name, "AI", is_white
+            return game_mode, ai_speed, player_name, "AI", is_white, None, time_control
 
 def game_mode_selection_loop():
     clock = pygame.time.Clock()
@@ -665,9 +679,10 @@ def game_mode_selection_loop():
     # Create mode selection buttons
     pvp_button = Button(WINDOW_SIZE//2 - button_width//2, center_y - 100, button_width, button_height, "Play with Friend", MENU_BUTTON_BG)
     ai_button = Button(WINDOW_SIZE//2 - button_width//2, center_y - 20, button_width, button_height, "Play with AI", MENU_BUTTON_BG)
+    lan_button = Button(WINDOW_SIZE//2 - button_width//2, center_y + 60, button_width, button_height, "Play over Network", MENU_BUTTON_BG)
     
     # Initialize button states
-    buttons = [pvp_button, ai_button]
+    buttons = [pvp_button, ai_button, lan_button]
     for button in buttons:
         button.animation_offset = 50  # Start with offset
         button.target_offset = 0      # Target position
@@ -687,16 +702,14 @@ def game_mode_selection_loop():
             pygame.draw.line(screen, (35, 35, 45), (MENU_MARGIN, i), (WINDOW_SIZE - MENU_MARGIN, i))
         
         # Draw title with shadow effect
-        font_title = pygame.font.SysFont('Arial', 72, bold=True)
-        
         # Multiple shadow layers for depth
         for offset in range(4, 0, -1):
-            shadow = font_title.render("Chess Game", True, (0, 0, 0))
+            shadow = render_text("Chess Game", (0, 0, 0), 'Arial', 72, bold=True)
             shadow_rect = shadow.get_rect(center=(WINDOW_SIZE // 2 + offset, 120 + offset))
             screen.blit(shadow, shadow_rect)
         
         # Main title
-        title = font_title.render("Chess Game", True, MENU_TITLE_COLOR)
+        title = render_text("Chess Game", MENU_TITLE_COLOR, 'Arial', 72, bold=True)
         title_rect = title.get_rect(center=(WINDOW_SIZE // 2, 120))
         screen.blit(title, title_rect)
         
@@ -724,6 +737,11 @@ def game_mode_selection_loop():
                     pygame.display.flip()
                     pygame.time.wait(200)
                     return "AI"
+                elif lan_button.rect.collidepoint(mouse_pos):
+                    lan_button.selected = True
+                    pygame.display.flip()
+                    pygame.time.wait(200)
+                    return "LAN"
             
             # Handle hover effects
             if event.type == pygame.MOUSEMOTION:
@@ -733,309 +751,278 @@ def game_mode_selection_loop():
         
         clock.tick(FPS)
  
-# Game logic functions
-def get_raw_moves(board, start_pos, piece):
-    """Get moves without considering check (to avoid recursion)"""
-    valid_moves = []
-    row, col = start_pos
-    piece_type = piece[1]
-    piece_color = piece[0]
-    
-    # Determine pawn direction based on color and board orientation
-    if is_white:  # White at bottom
-        direction = -1 if piece_color == 'white' else 1
-        start_row = 6 if piece_color == 'white' else 1
-    else:  # Black at bottom
-        direction = -1 if piece_color == 'black' else 1
-        start_row = 6 if piece_color == 'black' else 1
- 
-    if piece_type == 'pawn':
-        # Forward move
-        new_row = row + direction
-        if 0 <= new_row < BOARD_SIZE:
-            if not board[new_row][col]:
-                valid_moves.append((new_row, col))
-                # Initial two-square move
-                if row == start_row:
-                    new_row = row + 2 * direction
-                    if 0 <= new_row < BOARD_SIZE and not board[new_row][col]:
-                        valid_moves.append((new_row, col))
-       
-        # Diagonal captures
-        for dcol in [-1, 1]:
-            new_col = col + dcol
-            new_row = row + direction
-            if 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
-                target = board[new_row][new_col]
-                if target and target[0] != piece_color:
-                    valid_moves.append((new_row, new_col))
- 
-    elif piece_type in ['rook', 'bishop', 'queen']:
-        directions = []
-        if piece_type in ['rook', 'queen']:
-            directions.extend([(0, 1), (0, -1), (1, 0), (-1, 0)])
-        if piece_type in ['bishop', 'queen']:
-            directions.extend([(1, 1), (1, -1), (-1, 1), (-1, -1)])
-        
-        for drow, dcol in directions:
-            new_row, new_col = row + drow, col + dcol
-            while 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
-                target = board[new_row][new_col]
-                if not target:
-                    valid_moves.append((new_row, new_col))
-                else:
-                    if target[0] != piece_color:
-                        valid_moves.append((new_row, new_col))
-                    break
-                new_row += drow
-                new_col += dcol
- 
-    elif piece_type == 'knight':
-        moves = [
-            (row + 2, col + 1), (row + 2, col - 1),
-            (row - 2, col + 1), (row - 2, col - 1),
-            (row + 1, col + 2), (row + 1, col - 2),
-            (row - 1, col + 2), (row - 1, col - 2)
-        ]
-        for new_row, new_col in moves:
-            if 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
-                target = board[new_row][new_col]
-                if not target or target[0] != piece_color:
-                    valid_moves.append((new_row, new_col))
- 
-    elif piece_type == 'king':
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-        for drow, dcol in directions:
-            new_row, new_col = row + drow, col + dcol
-            if 0 <= new_row < BOARD_SIZE and 0 <= new_col < BOARD_SIZE:
-                target = board[new_row][new_col]
-                if not target or target[0] != piece_color:
-                    valid_moves.append((new_row, new_col))
-    
-    return valid_moves
- 
-def get_valid_moves(board, start_pos, piece):
-    valid_moves = []
-    raw_moves = get_raw_moves(board, start_pos, piece)
-   
-    # Test each move to ensure it doesn't leave or put the king in check
-    for move in raw_moves:
-        temp_board = [row[:] for row in board]
-        temp_board[move[0]][move[1]] = piece
-        temp_board[start_pos[0]][start_pos[1]] = ''
-       
-        if not is_in_check(temp_board, piece[0]):
-            valid_moves.append(move)
- 
-    return valid_moves
- 
-def evaluate_board(board):
-    score = 0
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece:
-                value = PIECE_VALUES[piece[1]]
-                if piece[0] == 'white':
-                    score += value
-                else:
-                    score -= value
-    return score
+def wait_for_frame(clock, animating, idle_ms=IDLE_WAIT_MS):
+    """Cap the frame rate while something animates, otherwise sleep until input arrives
+
+    Returns the event that ended the wait, if any, in a list; the caller handles it before
+    the ones pygame.event.get() returns, so events keep their order.
+    """
+    if animating:
+        clock.tick(FPS)
+        return []
+    event = pygame.event.wait(idle_ms)
+    clock.tick()
+    return [] if event.type == pygame.NOEVENT else [event]
  
 # Add performance monitoring
-def show_fps(screen, clock):
-    font = pygame.font.SysFont('Arial', 20)
-    fps = str(int(clock.get_fps()))
-    fps_text = font.render(f'FPS: {fps}', True, BLACK)
-    screen.blit(fps_text, (10, 10))
+FPS_PANEL = pygame.Rect(5, 5, 100, 30)  # Area of the top bar reserved for the FPS counter
+PROFILER_PANEL = pygame.Rect(5, 5, 300, 136)  # Area covered by the frame profiler overlay
+PROFILER_PHASES = ('events', 'rules', 'ai', 'draw', 'flip')
+PROFILER_HISTORY = 600  # Frames kept in the rolling timing buffer
+PROFILER_REFRESH_MS = 250  # How often the overlay text is recomputed
+
+class FrameProfiler:
+    """Rolling per-phase frame timings, shown as an FPS counter or a p50/p95/p99 table"""
+    def __init__(self, history=PROFILER_HISTORY):
+        self.samples = np.zeros((history, len(PROFILER_PHASES)), dtype=np.int64)
+        self.frame = np.zeros(len(PROFILER_PHASES), dtype=np.int64)
+        self.index = 0
+        self.count = 0
+        self.last_mark = time.perf_counter_ns()
+        self.visible = False
+        self.lines = None
+        self.last_refresh = 0
+    
+    def begin_frame(self):
+        self.frame[:] = 0
+        self.last_mark = time.perf_counter_ns()
+    
+    def end_phase(self, phase):
+        # Charge the time since the previous mark to this phase
+        now = time.perf_counter_ns()
+        self.frame[PROFILER_PHASES.index(phase)] += now - self.last_mark
+        self.last_mark = now
+    
+    def end_frame(self):
+        self.samples[self.index] = self.frame
+        self.index = (self.index + 1) % len(self.samples)
+        self.count = min(self.count + 1, len(self.samples))
+    
+    def ordered_samples(self):
+        """Buffered frames, oldest first"""
+        if self.count < len(self.samples):
+            return self.samples[:self.count]
+        return np.roll(self.samples, -self.index, axis=0)
+    
+    def percentiles(self):
+        """p50/p95/p99 in milliseconds for each phase, with the whole frame last"""
+        samples = self.ordered_samples()
+        frames = np.hstack([samples, samples.sum(axis=1, keepdims=True)])
+        return np.percentile(frames, [50, 95, 99], axis=0) / 1e6
+    
+    def toggle(self):
+        self.visible = not self.visible
+        self.lines = None
+    
+    def draw(self, screen, clock, dirty, force=False):
+        now = pygame.time.get_ticks()
+        if not force and self.lines is not None and now - self.last_refresh < PROFILER_REFRESH_MS:
+            return
+        self.last_refresh = now
+        
+        fps = int(clock.get_fps())
+        if self.visible and self.count:
+            table = self.percentiles()
+            lines = [f"FPS {fps:<4}   p50    p95    p99 ms"]
+            for name, column in zip(PROFILER_PHASES + ('frame',), table.T):
+                lines.append(f"{name:<8}" + "".join(f"{value:7.2f}" for value in column))
+        else:
+            lines = [f'FPS: {fps}']
+        if lines == self.lines and not force:
+            return
+        self.lines = lines
+        
+        if self.visible:
+            pygame.draw.rect(screen, MENU_BG, PROFILER_PANEL)
+            pygame.draw.rect(screen, MENU_BORDER_COLOR, PROFILER_PANEL, 1)
+            for i, line in enumerate(lines):
+                screen.blit(render_text(line, MENU_TEXT_COLOR, 'couriernew', 16), (12, 10 + i * 18))
+            dirty.mark(PROFILER_PANEL)
+        else:
+            pygame.draw.rect(screen, MENU_BG, FPS_PANEL)
+            screen.blit(render_text(lines[0], BLACK, 'Arial', 20), (10, 10))
+            dirty.mark(FPS_PANEL)
+    
+    def export_csv(self, path):
+        """Write the buffered frame timings in milliseconds, oldest frame first"""
+        if not self.count:
+            return
+        with open(path, 'w') as f:
+            f.write(",".join(('frame',) + PROFILER_PHASES + ('total',)) + "\n")
+            for i, row in enumerate(self.ordered_samples()):
+                values = [value / 1e6 for value in row] + [row.sum() / 1e6]
+                f.write(",".join([str(i)] + [f"{value:.3f}" for value in values]) + "\n")
  
-# Optimize minimax with move ordering and better pruning
-def minimax(board, depth, alpha, beta, maximizing_player):
-    if depth == 0:
-        return evaluate_board(board), None
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples while a capture runs
 
-    # Pre-calculate all valid moves and sort them by potential value
-    moves = []
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece and piece[0] == ('white' if maximizing_player else 'black'):
-                valid_moves = get_valid_moves(board, (row, col), piece)
-                for move in valid_moves:
-                    temp_board = [row[:] for row in board]
-                    temp_board[move[0]][move[1]] = piece
-                    temp_board[row][col] = ''
-                    score = evaluate_board(temp_board)
-                    moves.append((score, (row, col), move))
+class ProfileCapture:
+    """On-demand cProfile run plus a stack sampler for flamegraphs; costs nothing while stopped
 
-    # Sort moves by score
-    moves.sort(reverse=maximizing_player)
+    The sampler sees every thread, but cProfile only the main one: work submitted to other
+    threads is profiled by wrapping it in run().
+    """
+    def __init__(self):
+        self.profile = None
+        self.worker_profiles = None
+        self.stacks = None
+        self.stop_event = None
+        self.sampler = None
+    
+    def active(self):
+        return self.profile is not None
+    
+    def toggle(self):
+        if self.active():
+            return self.stop()
+        self.start()
+        return None
+    
+    def start(self):
+        self.stacks = collections.Counter()
+        self.worker_profiles = []
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_threads, daemon=True)
+        self.sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+    
+    def run(self, function, *args):
+        """Call function, adding it to the capture if one is running; for worker threads"""
+        profiles = self.worker_profiles
+        if profiles is None:
+            return function(*args)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Python 3.12+ allows one profiler, and the main one sees all threads
+            return function(*args)
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+            profiles.append(profile)
+    
+    def sample_threads(self):
+        """Sample every thread but this one, rooting each stack at its thread's name"""
+        sampler_id = threading.get_ident()
+        while not self.stop_event.wait(PROFILE_SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.stacks[';'.join(reversed(stack))] += 1
+    
+    def stop(self):
+        """Stop the capture and write <name>.pstats and <name>.collapsed; returns the base name"""
+        self.profile.disable()
+        self.stop_event.set()
+        self.sampler.join()
+        
+        name = time.strftime('profile_%Y%m%d_%H%M%S')
+        stats = pstats.Stats(self.profile)
+        for profile in self.worker_profiles:
+            stats.add(profile)
+        stats.dump_stats(name + '.pstats')
+        with open(name + '.collapsed', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        
+        self.profile = None
+        self.worker_profiles = None
+        self.stacks = None
+        return name
 
-    if maximizing_player:
-        max_eval = float('-inf')
-        best_move = None
-        for _, start, end in moves:
-            piece = board[start[0]][start[1]]
-            temp_board = [row[:] for row in board]
-            temp_board[end[0]][end[1]] = piece
-            temp_board[start[0]][start[1]] = ''
-            eval, _ = minimax(temp_board, depth - 1, alpha, beta, False)
-            if eval > max_eval:
-                max_eval = eval
-                best_move = (start, end)
-            alpha = max(alpha, eval)
-            if beta <= alpha:
-                break
-        return max_eval, best_move
-    else:
-        min_eval = float('inf')
-        best_move = None
-        for _, start, end in moves:
-            piece = board[start[0]][start[1]]
-            temp_board = [row[:] for row in board]
-            temp_board[end[0]][end[1]] = piece
-            temp_board[start[0]][start[1]] = ''
-            eval, _ = minimax(temp_board, depth - 1, alpha, beta, True)
-            if eval < min_eval:
-                min_eval = eval
-                best_move = (start, end)
-            beta = min(beta, eval)
-            if beta <= alpha:
-                break
-        return min_eval, best_move
- 
-def make_ai_move(board):
-    _, best_move = minimax(board, 3, float('-inf'), float('inf'), False)
-    if best_move:
-        start_pos, end_pos = best_move
-        piece = board[start_pos[0]][start_pos[1]]
-        board[end_pos[0]][end_pos[1]] = piece
-        board[start_pos[0]][start_pos[1]] = ''
-        return True
-    return False
- 
-def make_easy_ai_move(board):
-    """Make a simple move for easy AI mode with some randomness"""
-    possible_moves = []
-    # Collect all possible moves for black pieces
+def create_board_layers():
+    """Pre-render the checkerboard and the highlight overlays once"""
+    background = pygame.Surface((BOARD_SIZE * SQUARE_SIZE, BOARD_SIZE * SQUARE_SIZE)).convert()
     for row in range(BOARD_SIZE):
         for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece and piece[0] == 'black':
-                valid_moves = get_valid_moves(board, (row, col), piece)
-                for move in valid_moves:
-                    possible_moves.append(((row, col), move))
-    
-    if possible_moves:
-        # Randomly select a move from the possible moves
-        start_pos, end_pos = random.choice(possible_moves)
-        piece = board[start_pos[0]][start_pos[1]]
-        board[end_pos[0]][end_pos[1]] = piece
-        board[start_pos[0]][start_pos[1]] = ''
-        return True, (start_pos, end_pos)
-    return False, None
- 
-def create_board(white_at_bottom=True):
-    board = [['' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-    
-    if white_at_bottom:
-        # Set up pawns
-        for i in range(BOARD_SIZE):
-            board[6][i] = ('white', 'pawn')  # White pawns on row 6 (second from bottom)
-            board[1][i] = ('black', 'pawn')  # Black pawns on row 1 (second from top)
-        
-        # Set up other pieces
-        pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook']
-        for i in range(BOARD_SIZE):
-            board[7][i] = ('white', pieces[i])  # White pieces on bottom row
-            board[0][i] = ('black', pieces[i])  # Black pieces on top row
-    else:
-        # Set up pawns for black at bottom
-        for i in range(BOARD_SIZE):
-            board[6][i] = ('black', 'pawn')  # Black pawns on row 6 (second from bottom)
-            board[1][i] = ('white', 'pawn')  # White pawns on row 1 (second from top)
-        
-        # Set up other pieces for black at bottom
-        pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook']
-        for i in range(BOARD_SIZE):
-            board[7][i] = ('black', pieces[i])  # Black pieces on bottom row
-            board[0][i] = ('white', pieces[i])  # White pieces on top row
-    
-    return board
+            color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
+            pygame.draw.rect(background, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    
+    # One square-sized overlay per highlight color, with the alpha used by draw_board
+    overlays = {}
+    for name, color, alpha in [('last_move', LAST_MOVE, 128),
+                               ('valid_move', VALID_MOVE_HIGHLIGHT, 160),
+                               ('selected', SELECTED_PIECE, 180),
+                               ('checked_king', CHECKED_KING, 180)]:
+        s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE)).convert()
+        s.set_alpha(alpha)
+        s.fill(color[:3])
+        overlays[name] = s
+    
+    return background, overlays
  
 def draw_board(screen, selected_piece=None, valid_moves=None, last_move=None):
-    # First draw the base board
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
-            pygame.draw.rect(screen, color, (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2, 
-                                          row * SQUARE_SIZE + BOARD_OFFSET_Y, 
-                                          SQUARE_SIZE, SQUARE_SIZE))
+    # First draw the base board from the cached layer
+    screen.blit(board_background, (BOARD_OFFSET_X, BOARD_OFFSET_Y))
     
     # Draw last move highlight
     if last_move:
         start, end = last_move
         for pos in [start, end]:
-            s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            s.set_alpha(128)
-            s.fill(LAST_MOVE)
-            screen.blit(s, (pos[1] * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                          pos[0] * SQUARE_SIZE + BOARD_OFFSET_Y))
+            screen.blit(highlight_overlays['last_move'], get_square_rect(pos))
     
     # Draw valid moves with better visibility
     if valid_moves:
-        for row, col in valid_moves:
-            s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            s.set_alpha(160)
-            s.fill(VALID_MOVE_HIGHLIGHT)
-            screen.blit(s, (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                          row * SQUARE_SIZE + BOARD_OFFSET_Y))
+        for move in valid_moves:
+            square = get_square_rect(move)
+            screen.blit(highlight_overlays['valid_move'], square)
             # Draw a border around valid move squares
-            pygame.draw.rect(screen, BLACK, (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                                          row * SQUARE_SIZE + BOARD_OFFSET_Y,
-                                          SQUARE_SIZE, SQUARE_SIZE), 2)
+            pygame.draw.rect(screen, BLACK, square, 2)
     
     # Draw selected piece highlight
     if selected_piece:
-        row, col = selected_piece
-        s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
-        s.set_alpha(180)
-        s.fill(SELECTED_PIECE)
-        screen.blit(s, (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                       row * SQUARE_SIZE + BOARD_OFFSET_Y))
-        pygame.draw.rect(screen, BLACK, (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                                       row * SQUARE_SIZE + BOARD_OFFSET_Y,
-                                       SQUARE_SIZE, SQUARE_SIZE), 3)
+        square = get_square_rect(selected_piece)
+        screen.blit(highlight_overlays['selected'], square)
+        pygame.draw.rect(screen, BLACK, square, 3)
     
     # Draw pieces with increased size and ensure they're centered
     for row in range(BOARD_SIZE):
         for col in range(BOARD_SIZE):
             piece = board[row][col]
             if piece:
+                square = get_square_rect((row, col))
                 color = WHITE if piece[0] == 'white' else BLACK
                 # Increase font size to 80% of square size
-                font = pygame.font.SysFont('segoeuisymbol', int(SQUARE_SIZE * 0.8))
-                text = font.render(PIECES[piece[0]][piece[1]], True, color)
+                text = render_text(PIECES[piece[0]][piece[1]], color, 'segoeuisymbol', int(SQUARE_SIZE * 0.8))
                 # Center the piece in the square
-                text_rect = text.get_rect(center=(col * SQUARE_SIZE + SQUARE_SIZE // 2 + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                                                row * SQUARE_SIZE + SQUARE_SIZE // 2 + BOARD_OFFSET_Y))
+                text_rect = text.get_rect(center=square.center)
                 screen.blit(text, text_rect)
                 
                 # Highlight king in check
                 if piece[1] == 'king' and is_in_check(board, piece[0]):
-                    s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
-                    s.set_alpha(180)
-                    s.fill(CHECKED_KING)
-                    screen.blit(s, (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                                  row * SQUARE_SIZE + BOARD_OFFSET_Y))
-                    pygame.draw.rect(screen, (255, 0, 0), (col * SQUARE_SIZE + (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2,
-                                                         row * SQUARE_SIZE + BOARD_OFFSET_Y,
-                                                         SQUARE_SIZE, SQUARE_SIZE), 3)
+                    screen.blit(highlight_overlays['checked_king'], square)
+                    pygame.draw.rect(screen, (255, 0, 0), square, 3)
+ 
+def view_square(pos):
+    """Map a board square to where it is drawn, or a drawn square back to the board
+
+    The board is always stored with white on rows 6-7; with black at the bottom the view
+    is rotated by 180 degrees.
+    """
+    row, col = pos
+    if is_white:
+        return row, col
+    return BOARD_SIZE - 1 - row, BOARD_SIZE - 1 - col
+ 
+def get_square_rect(pos):
+    """Screen rectangle covered by the board square at (row, col)"""
+    row, col = view_square(pos)
+    return pygame.Rect(col * SQUARE_SIZE + BOARD_OFFSET_X, row * SQUARE_SIZE + BOARD_OFFSET_Y,
+                       SQUARE_SIZE, SQUARE_SIZE)
  
 def get_board_position(pos):
     x, y = pos
     # Adjust coordinates to account for board offset
-    x = x - (WINDOW_SIZE - BOARD_SIZE * SQUARE_SIZE) // 2
+    x = x - BOARD_OFFSET_X
     y = y - BOARD_OFFSET_Y
     
     # Check if the click is within the board boundaries
@@ -1049,80 +1036,20 @@ def get_board_position(pos):
     if row < 0 or row >= BOARD_SIZE or col < 0 or col >= BOARD_SIZE:
         return None
         
-    return row, col
+    return view_square((row, col))
  
 def is_valid_move(start, end, piece):
     valid_moves = get_valid_moves(board, start, piece)
     return end in valid_moves
  
-def is_in_check(board, color):
-    # Find king position
-    king_pos = None
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece and piece[0] == color and piece[1] == 'king':
-                king_pos = (row, col)
-                break
-        if king_pos:
-            break
-   
-    # Check if any opponent piece can attack the king
-    opponent = 'black' if color == 'white' else 'white'
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece and piece[0] == opponent:
-                moves = get_raw_moves(board, (row, col), piece)  # Use raw moves to avoid recursion
-                if king_pos in moves:
-                    return True
-    return False
- 
-def is_checkmate(board, color):
-    if not is_in_check(board, color):
-        return False
-   
-    # Try all possible moves for all pieces
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece and piece[0] == color:
-                valid_moves = get_valid_moves(board, (row, col), piece)
-                for move in valid_moves:
-                    # Try the move
-                    temp_board = [row[:] for row in board]
-                    temp_board[move[0]][move[1]] = piece
-                    temp_board[row][col] = ''
-                   
-                    # If this move gets us out of check, it's not checkmate
-                    if not is_in_check(temp_board, color):
-                        return False
-    return True
- 
-def is_stalemate(board, color):
-    if is_in_check(board, color):
-        return False
-   
-    # Check if any piece has valid moves
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece and piece[0] == color:
-                valid_moves = get_valid_moves(board, (row, col), piece)
-                if valid_moves:
-                    return False
-    return True
- 
 def draw_game_status(screen, current_player, is_check, is_mate):
     # Fill the top and bottom areas with a dark background
     pygame.draw.rect(screen, MENU_BG, (0, 0, WINDOW_SIZE, BOARD_OFFSET_Y))
     pygame.draw.rect(screen, MENU_BG, (0, WINDOW_SIZE - BOARD_OFFSET_Y, WINDOW_SIZE, BOARD_OFFSET_Y))
     
     # Draw player names with better visibility
-    font = pygame.font.SysFont('Arial', 32, bold=True)
-    
     # Draw white player name at top
-    white_text = font.render(player1_name, True, MENU_TEXT_COLOR)
+    white_text = render_text(player1_name, MENU_TEXT_COLOR, 'Arial', 32, bold=True)
     white_rect = white_text.get_rect(center=(WINDOW_SIZE // 2, BOARD_OFFSET_Y // 2))
     # Add background for white player name
     bg_rect = white_rect.copy()
@@ -1132,7 +1059,7 @@ def draw_game_status(screen, current_player, is_check, is_mate):
     screen.blit(white_text, white_rect)
     
     # Draw black player name at bottom
-    black_text = font.render(player2_name, True, MENU_TEXT_COLOR)
+    black_text = render_text(player2_name, MENU_TEXT_COLOR, 'Arial', 32, bold=True)
     black_rect = black_text.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE - BOARD_OFFSET_Y // 2))
     # Add background for black player name
     bg_rect = black_rect.copy()
@@ -1154,7 +1081,7 @@ def draw_game_status(screen, current_player, is_check, is_mate):
             text_color = RED
         
         if status_text:
-            text_surface = font.render(status_text, True, text_color)
+            text_surface = render_text(status_text, text_color, 'Arial', 32, bold=True)
             text_rect = text_surface.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE // 2))
             # Draw background for text with padding
             bg_rect = text_rect.copy()
@@ -1166,14 +1093,26 @@ def draw_game_status(screen, current_player, is_check, is_mate):
                 pygame.draw.rect(screen, MENU_BORDER_COLOR, bg_rect, 2, border_radius=5)
             screen.blit(text_surface, text_rect)
  
+def clock_rect(color):
+    """Clock box at the right end of color's player bar"""
+    top = 0 if color == 'white' else WINDOW_SIZE - BOARD_OFFSET_Y
+    return pygame.Rect(WINDOW_SIZE - CLOCK_WIDTH - 10, top + 5, CLOCK_WIDTH, BOARD_OFFSET_Y - 10)
+ 
+def draw_clocks(screen, game_clock):
+    """Draw both clocks, outlining the one that is running"""
+    for color in ('white', 'black'):
+        rect = clock_rect(color)
+        remaining = game_clock.remaining(color)
+        pygame.draw.rect(screen, MENU_BUTTON_BG, rect, border_radius=5)
+        border = MENU_ACCENT_COLOR if game_clock.running == color else MENU_BORDER_COLOR
+        pygame.draw.rect(screen, border, rect, 2, border_radius=5)
+        text_surface = render_text(format_clock(remaining), RED if remaining <= 0 else MENU_TEXT_COLOR, 'Arial', 28)
+        screen.blit(text_surface, text_surface.get_rect(center=rect.center))
+ 
 def handle_pawn_promotion(board, pos, color):
     row, col = pos
-    # Check if pawn has reached the opposite end based on board orientation
-    if is_white:  # White pieces at bottom
-        promotion_row = 0 if color == 'white' else 7
-    else:  # Black pieces at bottom
-        promotion_row = 7 if color == 'white' else 0
-        
+    # Check if pawn has reached the opposite end
+    promotion_row = 0 if color == 'white' else BOARD_SIZE - 1
     if row == promotion_row:
         promoted_piece = show_promotion_menu(screen, pos, color)
         if promoted_piece:
@@ -1208,8 +1147,7 @@ def show_promotion_menu(screen, pos, color):
     pygame.draw.rect(screen, (75, 75, 85), menu_rect, 2, border_radius=15)  # Border
     
     # Draw title with better styling
-    font = pygame.font.SysFont('Arial', 36, bold=True)
-    title = font.render("Promote Pawn", True, MENU_TEXT_COLOR)
+    title = render_text("Promote Pawn", MENU_TEXT_COLOR, 'Arial', 36, bold=True)
     title_rect = title.get_rect(center=(WINDOW_SIZE // 2, menu_y + 40))
     screen.blit(title, title_rect)
     
@@ -1231,8 +1169,10 @@ def show_promotion_menu(screen, pos, color):
         buttons.append(PromotionButton(x, y, button_size, button_size, piece, color))
     
     # Event loop for promotion selection
+    clock = pygame.time.Clock()
+    waited_events = []
     while True:
-        for event in pygame.event.get():
+        for event in waited_events + pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1252,6 +1192,7 @@ def show_promotion_menu(screen, pos, color):
             button.draw(screen)
         
         pygame.display.flip()
+        waited_events = wait_for_frame(clock, False)
 
 def draw_side_selection():
     screen.fill(MENU_BG)
@@ -1262,32 +1203,30 @@ def draw_side_selection():
         pygame.draw.line(screen, (35, 35, 45), (0, i), (WINDOW_SIZE, i), 1)
     
     # Draw main title with enhanced shadow effect
-    font_title = pygame.font.SysFont('Arial', 72, bold=True)
     title_y = 100
     
     # Draw multiple shadow layers for better depth
     shadow_offsets = [(4, 4), (3, 3), (2, 2)]
     for offset_x, offset_y in shadow_offsets:
-        shadow = font_title.render("Chess Game", True, (20, 20, 30))
+        shadow = render_text("Chess Game", (20, 20, 30), 'Arial', 72, bold=True)
         shadow_rect = shadow.get_rect(center=(WINDOW_SIZE // 2 + offset_x, title_y + offset_y))
         screen.blit(shadow, shadow_rect)
     
     # Draw main title with glow
-    title = font_title.render("Chess Game", True, MENU_TITLE_COLOR)
+    title = render_text("Chess Game", MENU_TITLE_COLOR, 'Arial', 72, bold=True)
     title_rect = title.get_rect(center=(WINDOW_SIZE // 2, title_y))
     screen.blit(title, title_rect)
     
     # Draw subtitle with enhanced styling
-    font_subtitle = pygame.font.SysFont('Arial', 42, bold=True)
     subtitle_y = title_y + 100
     
     # Draw subtitle shadow
-    subtitle_shadow = font_subtitle.render("Select Your Position", True, (20, 20, 30))
+    subtitle_shadow = render_text("Select Your Position", (20, 20, 30), 'Arial', 42, bold=True)
     subtitle_shadow_rect = subtitle_shadow.get_rect(center=(WINDOW_SIZE // 2 + 2, subtitle_y + 2))
     screen.blit(subtitle_shadow, subtitle_shadow_rect)
     
     # Draw main subtitle
-    subtitle = font_subtitle.render("Select Your Position", True, MENU_TITLE_COLOR)
+    subtitle = render_text("Select Your Position", MENU_TITLE_COLOR, 'Arial', 42, bold=True)
     subtitle_rect = subtitle.get_rect(center=(WINDOW_SIZE // 2, subtitle_y))
     screen.blit(subtitle, subtitle_rect)
     
@@ -1320,9 +1259,8 @@ def draw_side_selection():
     back_button = Button(20, 20, 120, 50, "Back", MENU_BUTTON_BG)
     
     # Draw helpful hint text with better styling
-    font_hint = pygame.font.SysFont('Arial', 28)
     hint_text = "Choose your preferred starting position"
-    hint_surface = font_hint.render(hint_text, True, MENU_TEXT_COLOR)
+    hint_surface = render_text(hint_text, MENU_TEXT_COLOR, 'Arial', 28)
     hint_rect = hint_surface.get_rect(center=(WINDOW_SIZE // 2, first_button_y + 2 * button_height + button_spacing + 40))
     screen.blit(hint_surface, hint_rect)
     
@@ -1422,17 +1360,14 @@ def show_skill_rating(screen, winner_stats, loser_stats=None):
     screen.blit(gradient_surface, panel_rect)
     pygame.draw.rect(screen, MENU_BORDER_COLOR, panel_rect, 3, border_radius=20)
     
+    # The border is static too, so bake it into the panel layer
+    pygame.draw.rect(gradient_surface, MENU_BORDER_COLOR, gradient_surface.get_rect(), 3, border_radius=20)
+    
     # Initialize celebration effects
-    fireworks = []
+    fireworks = FireworkSystem()
     celebration_start = pygame.time.get_ticks()
     winner_name = player1_name if winner_stats.color == 'white' else player2_name
     
-    # Enhanced fonts with adjusted sizes
-    title_font = pygame.font.SysFont('Arial', 64, bold=True)
-    stats_font = pygame.font.SysFont('Arial', 36, bold=True)
-    stats_value_font = pygame.font.SysFont('Arial', 36)
-    icon_font = pygame.font.SysFont('Arial', 48, bold=True)  # Larger font for icons
-    
     # Prepare stats text with labels and values separated
     stats_labels = [
         "Skill Rating",
@@ -1452,6 +1387,42 @@ def show_skill_rating(screen, winner_stats, loser_stats=None):
         f"{winner_stats.king_safety_score:.1f}"
     ]
     
+    # Pre-render the stats once into a panel-sized layer
+    stats_surface = pygame.Surface((panel_width, panel_height), pygame.SRCALPHA)
+    y_offset = 160  # Start stats lower to avoid title
+    for label, value in zip(stats_labels, stats_values):
+        # Draw label with right alignment
+        label_surface = render_text(label + ":", (200, 200, 200), 'Arial', 36, bold=True)
+        label_rect = label_surface.get_rect(right=panel_width // 2 - 20, y=y_offset)
+        stats_surface.blit(label_surface, label_rect)
+        
+        # Draw value with left alignment and golden color
+        value_surface = render_text(value, (255, 215, 0), 'Arial', 36)
+        value_rect = value_surface.get_rect(left=panel_width // 2 + 20, y=y_offset)
+        stats_surface.blit(value_surface, value_rect)
+        
+        y_offset += 55  # Increased spacing between stats
+    
+    # Precompute one period of the title pulse: scaled title and glow per step
+    pulse_steps = 24
+    title_surface = render_text(f"{winner_name} Wins!", (255, 255, 255), 'Arial', 64, bold=True)
+    title_rect = title_surface.get_rect()
+    title_frames = []
+    for step in range(pulse_steps):
+        pulse = math.sin(2 * math.pi * step / pulse_steps)
+        scale = 1 + 0.08 * pulse
+        scaled_surface = pygame.transform.scale(
+            title_surface,
+            (int(title_rect.width * scale), int(title_rect.height * scale))
+        )
+        scaled_rect = scaled_surface.get_rect(center=(WINDOW_SIZE // 2, panel_y + 80))
+        
+        # Add glow effect to title
+        glow_surface = pygame.Surface((scaled_rect.width + 20, scaled_rect.height + 20), pygame.SRCALPHA)
+        glow_alpha = int(128 + 64 * pulse)
+        pygame.draw.rect(glow_surface, (255, 255, 255, glow_alpha), glow_surface.get_rect(), border_radius=10)
+        title_frames.append((glow_surface, glow_surface.get_rect(center=scaled_rect.center), scaled_surface, scaled_rect))
+    
     # Create buttons with icons in a horizontal row
     button_size = 70  # Square buttons for icons
     button_spacing = 30
@@ -1497,63 +1468,32 @@ def show_skill_rating(screen, winner_stats, loser_stats=None):
         # Redraw panel background
         screen.blit(overlay, (0, 0))
         screen.blit(gradient_surface, panel_rect)
-        pygame.draw.rect(screen, MENU_BORDER_COLOR, panel_rect, 3, border_radius=20)
         
         # Create new fireworks
         if random.random() < 0.1:
             x = random.randint(0, WINDOW_SIZE)
             y = random.randint(0, WINDOW_SIZE // 2)
-            fireworks.append(Firework(x, y))
+            fireworks.launch(x, y)
         
         # Update and draw fireworks
-        for fw in fireworks[:]:
-            fw.update()
-            if not fw.alive:
-                fireworks.remove(fw)
-            else:
-                fw.draw(screen)
+        fireworks.update()
+        fireworks.draw(screen)
         
-        # Draw victory text with enhanced animation
-        scale = 1 + 0.08 * math.sin(elapsed * 0.004)
-        title_text = f"{winner_name} Wins!"
-        title_surface = title_font.render(title_text, True, (255, 255, 255))
-        title_rect = title_surface.get_rect()
-        scaled_surface = pygame.transform.scale(
-            title_surface,
-            (int(title_rect.width * scale), int(title_rect.height * scale))
-        )
-        scaled_rect = scaled_surface.get_rect(center=(WINDOW_SIZE // 2, panel_y + 80))
-        
-        # Add glow effect to title
-        glow_surface = pygame.Surface((scaled_rect.width + 20, scaled_rect.height + 20), pygame.SRCALPHA)
-        glow_alpha = int(128 + 64 * math.sin(elapsed * 0.004))
-        pygame.draw.rect(glow_surface, (255, 255, 255, glow_alpha), glow_surface.get_rect(), border_radius=10)
-        screen.blit(glow_surface, glow_surface.get_rect(center=scaled_rect.center))
+        # Draw victory text with the precomputed pulse frame
+        step = int(elapsed * 0.004 / (2 * math.pi) * pulse_steps) % pulse_steps
+        glow_surface, glow_rect, scaled_surface, scaled_rect = title_frames[step]
+        screen.blit(glow_surface, glow_rect)
         screen.blit(scaled_surface, scaled_rect)
         
-        # Draw stats with enhanced layout and proper spacing
-        stats_start_y = panel_y + 160  # Start stats lower to avoid title
-        y_offset = stats_start_y
-        for label, value in zip(stats_labels, stats_values):
-            # Draw label with right alignment
-            label_surface = stats_font.render(label + ":", True, (200, 200, 200))
-            label_rect = label_surface.get_rect(right=WINDOW_SIZE//2 - 20, y=y_offset)
-            screen.blit(label_surface, label_rect)
-            
-            # Draw value with left alignment and golden color
-            value_surface = stats_value_font.render(value, True, (255, 215, 0))
-            value_rect = value_surface.get_rect(left=WINDOW_SIZE//2 + 20, y=y_offset)
-            screen.blit(value_surface, value_rect)
-            
-            y_offset += 55  # Increased spacing between stats
+        # Draw stats
+        screen.blit(stats_surface, panel_rect)
         
         # Draw buttons with icons and hover effects
         for button, config in buttons:
             button.draw(screen)
             if button.hover:
                 # Draw tooltip with button text
-                tooltip_font = pygame.font.SysFont('Arial', 20)
-                tooltip = tooltip_font.render(config["text"], True, (255, 255, 255))
+                tooltip = render_text(config["text"], (255, 255, 255), 'Arial', 20)
                 tooltip_rect = tooltip.get_rect(centerx=button.rect.centerx, 
                                              bottom=button.rect.top - 5)
                 screen.blit(tooltip, tooltip_rect)
@@ -1561,11 +1501,83 @@ def show_skill_rating(screen, winner_stats, loser_stats=None):
         pygame.display.flip()
         clock.tick(60)
  
+def start_network_game(address):
+    """Host a game, or join the one at address; returns (peer, local color), or (None, None) offline"""
+    if game_mode != "LAN":
+        return None, None
+    try:
+        peer = net_play.NetPeer.join(address) if address else net_play.NetPeer.host()
+    except (OSError, ValueError) as e:
+        print(f"Network game unavailable, playing locally: {e}")
+        return None, None
+    local_color = 'black' if address else 'white'
+    peer.send_hello(player1_name if local_color == 'white' else player2_name)
+    return peer, local_color
+ 
+def start_game_clock(time_control):
+    """GameClock with white's time running, or None for an untimed game"""
+    if not time_control or not time_control[0]:
+        return None
+    game_clock = GameClock(*time_control)
+    game_clock.start('white')
+    return game_clock
+ 
+def ai_time_budget(board, color):
+    """(soft, hard) seconds the AI may think: from its clock in timed games, else from AI_SPEEDS"""
+    if game_clock is None:
+        soft = AI_SPEEDS[ai_speed]['thinking'] / 1000
+        return soft, 2 * soft
+    return allocate_time(game_clock.remaining(color), game_clock.increment, len(game_record.moves) // 2,
+                         len(get_all_moves(board, color)), is_in_check(board, color))
+ 
+def find_ai_move(board, history, budget):
+    """Black's move on a copy of the game; runs on the AI worker thread"""
+    # The hard time limit guarantees a move before the clock runs out
+    soft_limit, hard_limit = budget
+    if ai_speed in STRENGTH_LEVELS:
+        # Weaker levels spend a fixed node budget per move unless the clock is shorter
+        return choose_move_at_level(board, 'black', ai_speed, history=history, hard_limit=hard_limit)
+    _, move, _ = search(board, AI_DEPTH[ai_speed], False, history=history, soft_limit=soft_limit,
+                        hard_limit=hard_limit)
+    return move
+ 
+def is_legal_move(board, color, start_pos, end_pos, promotion):
+    """Whether color may play the move, promoting exactly when a pawn reaches the last row"""
+    piece = board[start_pos[0]][start_pos[1]]
+    if not piece or piece[0] != color or end_pos not in get_valid_moves(board, start_pos, piece):
+        return False
+    return (promotion is not None) == (piece[1] == 'pawn' and end_pos[0] in (0, BOARD_SIZE - 1))
+ 
+def replay_game(moves):
+    """Replay (start, end, promotion) moves from the start; returns (board, white_stats, black_stats, record, history, player)
+
+    Raises ValueError on an illegal move, leaving the current game untouched.
+    """
+    board = create_board()
+    stats = {'white': PlayerStats('white'), 'black': PlayerStats('black')}
+    record = GameRecord(board, player1_name, player2_name)
+    history = PositionHistory(board, 'white')
+    color = 'white'
+    for start_pos, end_pos, promotion in moves:
+        if not is_legal_move(board, color, start_pos, end_pos, promotion):
+            raise ValueError(f"Illegal move {encode_move(start_pos, end_pos, promotion)} at ply {len(record.moves)}")
+        opponent = 'black' if color == 'white' else 'white'
+        history.push_move(board, start_pos, end_pos, promotion)
+        make_move_with_stats(board, start_pos, end_pos, promotion, stats[color], stats[opponent])
+        record.add_move(start_pos, end_pos, promotion)
+        color = opponent
+    return board, stats['white'], stats['black'], record, history, color
+ 
 # Initialize the game
-game_mode, ai_speed, player1_name, player2_name, is_white = menu_loop()
+warm_fonts()
+game_mode, ai_speed, player1_name, player2_name, is_white, net_address, time_control = menu_loop()
+net_peer, net_color = start_network_game(net_address)
 
-# Create board with selected orientation
-board = create_board(is_white)  # Pass the orientation to create_board
+# Pre-render the static board layers
+board_background, highlight_overlays = create_board_layers()
+
+# Create the board; is_white only decides which way up it is drawn
+board = create_board()
 selected_piece = None
 current_player = 'white'
 valid_moves = None
@@ -1583,27 +1595,118 @@ last_move = None
 white_stats = PlayerStats('white')
 black_stats = PlayerStats('black')
 
+# Record the moves for PGN export
+game_record = GameRecord(board, player1_name, player2_name)
+position_history = PositionHistory(board, 'white')
+game_clock = start_game_clock(time_control)
+clock_shown = None  # What the clocks showed when last drawn
+
+# The AI searches on a worker thread, so the window and the clocks stay live meanwhile
+ai_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+ai_search = None  # Future of the AI move being searched
+
 # Main game loop
 running = True
 clock = pygame.time.Clock()
+dirty = DirtyRegions()
+profiler = FrameProfiler()
+atexit.register(profiler.export_csv, time.strftime('frame_profile_%Y%m%d_%H%M%S.csv'))
+profile_capture = ProfileCapture()
+game_status = None
+waited_events = []  # Event that ended the last idle wait, handled first next frame
 
 while running:
-    for event in pygame.event.get():
+    profiler.begin_frame()
+    for kind, payload in net_peer.poll() if net_peer else []:
+        if kind == net_play.HELLO:
+            opponent_name = payload.decode('utf-8', 'replace')
+            if net_color == 'white':
+                player2_name = game_record.headers['Black'] = opponent_name
+            else:
+                player1_name = game_record.headers['White'] = opponent_name
+            dirty.mark_all()
+        elif kind == net_play.MOVE:
+            try:
+                ply, code, position = net_play.decode_move_message(payload)
+                start_pos, end_pos, promotion = decode_move(code)
+            except ValueError:
+                net_peer.request_resync()
+                continue
+            # Anything that does not follow on from our position means the boards diverged
+            if (ply != len(game_record.moves) or current_player == net_color
+                    or not is_legal_move(board, current_player, start_pos, end_pos, promotion)
+                    or position_hash(board, current_player) != position_history.hashes[-1]
+                    or hash_after_move(position_history.hashes[-1], board, start_pos, end_pos, promotion) != position):
+                net_peer.request_resync()
+                continue
+            position_history.push_move(board, start_pos, end_pos, promotion)
+            mover_stats, opponent_stats = (white_stats, black_stats) if current_player == 'white' else (black_stats, white_stats)
+            make_move_with_stats(board, start_pos, end_pos, promotion, mover_stats, opponent_stats)
+            game_record.add_move(start_pos, end_pos, promotion)
+            dirty.mark_squares([selected_piece] + (valid_moves or []) + list(last_move or []) + [start_pos, end_pos])
+            last_move = (start_pos, end_pos)
+            selected_piece = None
+            valid_moves = None
+            current_player = net_color
+        elif kind == net_play.RESYNC:
+            net_peer.send_history([encode_move(*move) for move in game_record.moves])
+        elif kind == net_play.HISTORY:
+            try:
+                moves = [decode_move(code) for code in net_play.decode_history(payload)]
+                replayed = replay_game(moves)
+            except ValueError as e:
+                # A history that cannot be replayed cannot be resynced either
+                print(f"Invalid game history from the opponent: {e}")
+                net_peer.close()
+                break
+            if not moves:  # The opponent started a new game
+                game_record.save(PGN_FILE)
+            board, white_stats, black_stats, game_record, position_history, current_player = replayed
+            selected_piece = None
+            valid_moves = None
+            last_move = moves[-1][:2] if moves else None
+            dirty.mark_all()
+    if net_peer and net_peer.closed:
+        # Keep the position, but let both sides be played on this screen from now on
+        reason = f" ({net_peer.error})" if net_peer.error else ""
+        print(f"Network connection closed{reason}, continuing locally")
+        net_peer = None
+    for event in waited_events + pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.VIDEOEXPOSE:
+            dirty.mark_all()
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 running = False
             elif event.key == pygame.K_r:  # Restart game
+                game_record.save(PGN_FILE)
                 board = create_board()
                 selected_piece = None
                 current_player = 'white'
                 valid_moves = None
                 ai_thinking = False
                 last_move = None
-        elif event.type == pygame.MOUSEBUTTONDOWN and not ai_thinking:
+                white_stats = PlayerStats('white')
+                black_stats = PlayerStats('black')
+                game_record = GameRecord(board, player1_name, player2_name)
+                position_history = PositionHistory(board, 'white')
+                game_clock = start_game_clock(time_control)
+                ai_search = None
+                if net_peer:
+                    net_peer.send_history([])
+                dirty.mark_all()
+            elif event.key == pygame.K_F3:  # Toggle the frame profiler overlay
+                profiler.toggle()
+                dirty.mark_all()
+            elif event.key == pygame.K_F9:  # Start/stop a cProfile capture
+                capture_name = profile_capture.toggle()
+                if capture_name:
+                    print(f"Profile written to {capture_name}.pstats and {capture_name}.collapsed")
+        elif event.type == pygame.MOUSEBUTTONDOWN and not ai_thinking and not (net_peer and (current_player != net_color or not net_peer.connected)):
             pos = get_board_position(event.pos)
             if pos is None:  # Click was outside the board
+                dirty.mark_squares([selected_piece] + (valid_moves or []))
                 selected_piece = None
                 valid_moves = None
                 continue
@@ -1614,10 +1717,12 @@ while running:
                     if piece and piece[0] == current_player:
                         selected_piece = pos
                         valid_moves = get_valid_moves(board, pos, piece)
+                        dirty.mark_squares([selected_piece] + valid_moves)
                 else:
                     piece = board[selected_piece[0]][selected_piece[1]]
                     # Check if clicking on the same piece
                     if pos == selected_piece:
+                        dirty.mark_squares([selected_piece] + (valid_moves or []))
                         selected_piece = None
                         valid_moves = None
                     # Check if clicking on a valid move
@@ -1630,47 +1735,83 @@ while running:
                         board[selected_piece[0]][selected_piece[1]] = ''
                         
                         # Update stats
-                        if current_player == 'white':
-                            white_stats.update_stats(board, selected_piece, pos, captured_piece)
-                        else:
-                            black_stats.update_stats(board, selected_piece, pos, captured_piece)
+                        mover_stats, opponent_stats = (white_stats, black_stats) if current_player == 'white' else (black_stats, white_stats)
+                        mover_stats.update_stats(board, selected_piece, pos, captured_piece)
+                        opponent_stats.observe_opponent_move(pos, captured_piece)
                         
                         # Store last move
+                        dirty.mark_squares([selected_piece] + (valid_moves or []) + list(last_move or []))
                         last_move = (selected_piece, pos)
                         
                         # Handle pawn promotion
                         if piece[1] == 'pawn':
                             if handle_pawn_promotion(board, pos, piece[0]):
+                                mover_stats.record_promotion(pos)
                                 draw_board(screen, None, None, last_move)
                                 pygame.display.flip()
+                                dirty.mark_all()  # The promotion menu covered the whole window
+                        
+                        promotion = board[pos[0]][pos[1]][1] if board[pos[0]][pos[1]][1] != piece[1] else None
+                        game_record.add_move(last_move[0], last_move[1], promotion)
                         
                         # Switch player
                         current_player = 'black' if current_player == 'white' else 'white'
+                        position_history.push(position_hash(board, current_player), piece[1] == 'pawn' or bool(captured_piece))
+                        if game_clock:
+                            game_clock.press()
+                        if net_peer:
+                            net_peer.send_move(len(game_record.moves) - 1, encode_move(*game_record.moves[-1]),
+                                               position_history.hashes[-1])
                         selected_piece = None
                         valid_moves = None
                     # Click on different piece of same color
                     elif board[pos[0]][pos[1]] and board[pos[0]][pos[1]][0] == current_player:
+                        dirty.mark_squares([selected_piece] + (valid_moves or []))
                         selected_piece = pos
                         valid_moves = get_valid_moves(board, pos, board[pos[0]][pos[1]])
+                        dirty.mark_squares([selected_piece] + valid_moves)
             elif event.button == 3:  # Right click to deselect
+                dirty.mark_squares([selected_piece] + (valid_moves or []))
                 selected_piece = None
                 valid_moves = None
    
+    profiler.end_phase('events')
+    
     # Check game state
     in_check = is_in_check(board, current_player)
     in_checkmate = is_checkmate(board, current_player)
     in_stalemate = is_stalemate(board, current_player)
+    in_draw = in_stalemate or position_history.is_draw()  # Also threefold repetition and the fifty-move rule
+    flagged = game_clock.flagged() if game_clock and not (in_checkmate or in_draw) else None
+    if game_clock and (in_checkmate or in_draw or flagged):
+        game_clock.stop()
+    profiler.end_phase('rules')
+    
+    # Check banners and the checked king highlight span several regions, so redraw everything
+    new_status = (in_check, in_checkmate, in_draw, flagged, current_player if in_check else None)
+    if new_status != game_status:
+        game_status = new_status
+        dirty.mark_all()
    
     # If game is over, show message and wait for restart
-    if in_checkmate or in_stalemate:
-        draw_board(screen, selected_piece, valid_moves, last_move)
+    redrawn = False
+    if in_checkmate or in_draw or flagged:
+        if in_checkmate:
+            game_record.save(PGN_FILE, '1-0' if current_player == 'black' else '0-1')
+        elif flagged:
+            game_record.save(PGN_FILE, '0-1' if flagged == 'white' else '1-0')
+        else:
+            game_record.save(PGN_FILE, '1/2-1/2')
+        if dirty.needs_redraw():
+            draw_board(screen, selected_piece, valid_moves, last_move)
+            redrawn = True
         if in_checkmate:
             winner_stats = white_stats if current_player == 'black' else black_stats
             loser_stats = black_stats if current_player == 'black' else white_stats
             result = show_skill_rating(screen, winner_stats, loser_stats)
             if result == "restart":
                 # Reset the game
-                board = create_board(is_white)
+                board = create_board()
                 selected_piece = None
                 current_player = 'white'
                 valid_moves = None
@@ -1678,10 +1819,19 @@ while running:
                 last_move = None
                 white_stats = PlayerStats('white')
                 black_stats = PlayerStats('black')
+                game_record = GameRecord(board, player1_name, player2_name)
+                position_history = PositionHistory(board, 'white')
+                game_clock = start_game_clock(time_control)
+                ai_search = None
+                if net_peer:
+                    net_peer.send_history([])
             elif result == "menu":
                 # Return to main menu
-                game_mode, ai_speed, player1_name, player2_name, is_white = menu_loop()
-                board = create_board(is_white)
+                if net_peer:
+                    net_peer.close()
+                game_mode, ai_speed, player1_name, player2_name, is_white, net_address, time_control = menu_loop()
+                net_peer, net_color = start_network_game(net_address)
+                board = create_board()
                 selected_piece = None
                 current_player = 'white'
                 valid_moves = None
@@ -1689,44 +1839,94 @@ while running:
                 last_move = None
                 white_stats = PlayerStats('white')
                 black_stats = PlayerStats('black')
+                game_record = GameRecord(board, player1_name, player2_name)
+                position_history = PositionHistory(board, 'white')
+                game_clock = start_game_clock(time_control)
+                ai_search = None
             if result == "restart" or result == "menu":
+                dirty.mark_all()
                 continue
         else:
-            status_text = "Stalemate! Game is a draw!"
+            if flagged:
+                status_text = f"{flagged.capitalize()} loses on time!"
+            elif in_stalemate:
+                status_text = "Stalemate! Game is a draw!"
+            elif position_history.repetitions() >= 2:
+                status_text = "Draw by threefold repetition!"
+            else:
+                status_text = "Draw by the fifty-move rule!"
+        
+        if redrawn:
+            text_surface = render_text(status_text, BLACK, 'Arial', 48)
+            text_rect = text_surface.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE // 2))
+            screen.blit(text_surface, text_rect)
            
-        font = pygame.font.SysFont('Arial', 48)
-        text_surface = font.render(status_text, True, BLACK)
-        text_rect = text_surface.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE // 2))
-        screen.blit(text_surface, text_rect)
-       
-        restart_text = font.render("Press R to restart", True, BLACK)
-        restart_rect = restart_text.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE // 2 + 50))
-        screen.blit(restart_text, restart_rect)
+            restart_text = render_text("Press R to restart", BLACK, 'Arial', 48)
+            restart_rect = restart_text.get_rect(center=(WINDOW_SIZE // 2, WINDOW_SIZE // 2 + 50))
+            screen.blit(restart_text, restart_rect)
     else:
         # If playing against AI and it's AI's turn
-        if game_mode == "AI" and current_player == 'black' and not ai_thinking:
-            ai_thinking = True
-            
-            if ai_speed == "easy":
-                # Use simple random moves for easy mode
-                success, move = make_easy_ai_move(board)
-                if success:
+        if game_mode == "AI" and current_player == 'black':
+            if ai_search is None:
+                ai_thinking = True
+                ai_search = ai_executor.submit(profile_capture.run, find_ai_move, [row[:] for row in board],
+                                               position_history.copy(), ai_time_budget(board, 'black'))
+            elif ai_search.done():
+                move = ai_search.result()
+                ai_search = None
+                ai_thinking = False
+                if move:
                     start_pos, end_pos = move
-                    # Update AI stats
-                    black_stats.update_stats(board, start_pos, end_pos, board[end_pos[0]][end_pos[1]])
+                    piece = board[start_pos[0]][start_pos[1]]
+                    promotion = 'queen' if piece[1] == 'pawn' and end_pos[0] == BOARD_SIZE - 1 else None
+                    position_history.push_move(board, start_pos, end_pos, promotion)
+                    make_move_with_stats(board, start_pos, end_pos, promotion, black_stats, white_stats)
+                    dirty.mark_squares(list(last_move or []) + [start_pos, end_pos])
                     last_move = (start_pos, end_pos)
-            
-            # Switch back to player's turn
-            current_player = 'white'
-            ai_thinking = False
+                    game_record.add_move(start_pos, end_pos, promotion)
+                    current_player = 'white'
+                    if game_clock:
+                        game_clock.press()
+        profiler.end_phase('ai')
    
     # Draw the game state
-        draw_board(screen, selected_piece, valid_moves, last_move)
-        draw_game_status(screen, current_player, in_check, in_checkmate)
+        if dirty.needs_redraw():
+            draw_board(screen, selected_piece, valid_moves, last_move)
+            draw_game_status(screen, current_player, in_check, in_checkmate)
+            redrawn = True
    
-    show_fps(screen, clock)
-    pygame.display.flip()
-    clock.tick(FPS)
+    # The clocks are redrawn on their own whenever the time they show changes
+    if game_clock:
+        clock_state = (game_clock.running, format_clock(game_clock.remaining('white')),
+                       format_clock(game_clock.remaining('black')))
+        if redrawn or clock_state != clock_shown:
+            draw_clocks(screen, game_clock)
+            dirty.mark(clock_rect('white'))
+            dirty.mark(clock_rect('black'))
+            clock_shown = clock_state
+    
+    # Redrawing the status bar clears the profiler overlay, so force it back in that case
+    profiler.draw(screen, clock, dirty, force=redrawn)
+    profiler.end_phase('draw')
+    dirty.update()
+    profiler.end_phase('flip')
+    profiler.end_frame()
+    
+    # Only run at full frame rate while the AI has a move to make
+    ai_to_move = game_mode == "AI" and current_player == 'black' and not (in_checkmate or in_draw or flagged)
+    if net_peer:
+        idle_ms = NET_POLL_MS
+    elif game_clock and game_clock.running:
+        idle_ms = CLOCK_POLL_MS
+    else:
+        idle_ms = IDLE_WAIT_MS
+    waited_events = wait_for_frame(clock, ai_thinking or ai_to_move, idle_ms)
  
+if profile_capture.active():
+    profile_capture.stop()
+if net_peer:
+    net_peer.close()
+ai_executor.shutdown(cancel_futures=True)
+game_record.save(PGN_FILE)
 pygame.quit()
-sys.exit()
\ No newline at end of file
+sys.exit()
@@ -0,0 +1,187 @@
+"""Two-player games over TCP with compact move messages
+
+Each side keeps its own board and sends only the moves it plays. A message is a 3-byte
+header (kind, payload length) followed by the payload:
+
+  HELLO    player name, UTF-8
+  MOVE     ply number, 16-bit move code (see game_archive.encode_move) and the Zobrist hash
+           of the position after the move, 12 bytes in all
+  RESYNC   empty; asks the peer to send its move history
+  HISTORY  move count and every move code from the start; an empty history starts a new game
+
+The receiver of a move checks the ply number and the resulting hash, and asks for a RESYNC
+on any mismatch. The socket is non-blocking: poll() only takes what has already arrived, so
+the caller's render loop never waits on the network. Host names are looked up on a
+background thread for the same reason.
+"""
+import concurrent.futures
+import errno
+import socket
+import struct
+import threading
+
+HEADER = struct.Struct('<BH')  # Kind, payload length
+MOVE_PAYLOAD = struct.Struct('<HHQ')  # Ply, move code, position hash
+COUNT = struct.Struct('<H')
+HELLO, MOVE, RESYNC, HISTORY = 1, 2, 3, 4  # Message kinds
+DEFAULT_PORT = 8766
+RECV_SIZE = 4096
+
+class NetPeer:
+    """Non-blocking connection to the other player, hosting or joining"""
+    def __init__(self, listener=None, sock=None):
+        self.listener = listener
+        self.sock = sock
+        self.connected = False
+        self.closed = False
+        self.inbox = b''
+        self.outbox = b''
+        self.lookup = None  # Future of the address being joined, while its name is resolved
+        self.error = None  # Why joining failed, if it did
+    
+    @classmethod
+    def host(cls, port=DEFAULT_PORT):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('', port))
+        listener.listen(1)
+        listener.setblocking(False)
+        return cls(listener=listener)
+    
+    @classmethod
+    def join(cls, address):
+        """Connect to 'host' or 'host:port' without waiting for the name lookup or the connection
+
+        poll() starts connecting once the address is resolved; a failed lookup closes the peer.
+        """
+        host, _, port = address.partition(':')
+        port = int(port or DEFAULT_PORT)
+        peer = cls()
+        peer.lookup = concurrent.futures.Future()
+        
+        def resolve():
+            try:
+                peer.lookup.set_result(socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0][4])
+            except OSError as e:
+                peer.lookup.set_exception(e)
+        threading.Thread(target=resolve, daemon=True).start()
+        return peer
+    
+    @staticmethod
+    def connect(address):
+        """Non-blocking socket connecting to a resolved (ip, port)"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        error = sock.connect_ex(address)
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            raise OSError(error, f"Cannot connect to {address[0]}:{address[1]}")
+        return sock
+    
+    def poll(self):
+        """Send queued bytes and return the (kind, payload) messages received so far"""
+        if self.closed:
+            return []
+        if self.lookup is not None:
+            if not self.lookup.done():
+                return []
+            try:
+                self.sock = self.connect(self.lookup.result())
+            except OSError as e:
+                self.error = e
+                self.close()
+                return []
+            finally:
+                self.lookup = None
+        if self.sock is None:
+            try:
+                self.sock, _ = self.listener.accept()
+            except BlockingIOError:
+                return []
+            self.listener.close()
+            self.listener = None
+            self.sock.setblocking(False)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if not self.connected:
+            error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                self.close()
+                return []
+            try:
+                self.sock.getpeername()
+            except OSError:  # Connection still in progress
+                return []
+            self.connected = True
+        
+        self.flush()
+        while not self.closed:
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                break
+            except OSError:
+                self.close()
+                break
+            if not data:
+                self.close()
+                break
+            self.inbox += data
+        
+        messages = []
+        while len(self.inbox) >= HEADER.size:
+            kind, length = HEADER.unpack_from(self.inbox)
+            if len(self.inbox) < HEADER.size + length:
+                break
+            messages.append((kind, self.inbox[HEADER.size:HEADER.size + length]))
+            self.inbox = self.inbox[HEADER.size + length:]
+        return messages
+    
+    def send(self, kind, payload=b''):
+        self.outbox += HEADER.pack(kind, len(payload)) + payload
+        self.flush()
+    
+    def flush(self):
+        if not self.connected or self.closed:
+            return
+        try:
+            sent = self.sock.send(self.outbox)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close()
+            return
+        self.outbox = self.outbox[sent:]
+    
+    def send_hello(self, name):
+        self.send(HELLO, name.encode('utf-8')[:255])
+    
+    def send_move(self, ply, code, position):
+        self.send(MOVE, MOVE_PAYLOAD.pack(ply, code, position))
+    
+    def send_history(self, codes):
+        self.send(HISTORY, COUNT.pack(len(codes)) + struct.pack(f'<{len(codes)}H', *codes))
+    
+    def request_resync(self):
+        self.send(RESYNC)
+    
+    def close(self):
+        self.closed = True
+        for sock in (self.sock, self.listener):
+            if sock is not None:
+                sock.close()
+
+def decode_move_message(payload):
+    """(ply, move code, position hash) of a MOVE payload; raises ValueError if malformed"""
+    if len(payload) != MOVE_PAYLOAD.size:
+        raise ValueError(f"MOVE payload of {len(payload)} bytes")
+    return MOVE_PAYLOAD.unpack(payload)
+
+def decode_history(payload):
+    """Move codes of a HISTORY payload; raises ValueError if malformed"""
+    if len(payload) < COUNT.size:
+        raise ValueError("HISTORY payload without a move count")
+    count, = COUNT.unpack_from(payload)
+    if len(payload) != COUNT.size + 2 * count:
+        raise ValueError(f"HISTORY payload of {len(payload)} bytes for {count} moves")
+    return list(struct.unpack_from(f'<{count}H', payload, COUNT.size))
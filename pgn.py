@@ -0,0 +1,226 @@
+"""PGN export of recorded games and a streaming PGN reader"""
+import collections
+import os
+import re
+import time
+
+from chess_engine import (BOARD_SIZE, get_valid_moves, is_in_check, is_checkmate, make_move,
+                          square_name, parse_square)
+
+PIECE_LETTERS = {'king': 'K', 'queen': 'Q', 'rook': 'R', 'bishop': 'B', 'knight': 'N'}
+LETTER_PIECES = {letter: piece for piece, letter in PIECE_LETTERS.items()}
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+SAN_PATTERN = re.compile(r'^([KQRBN])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([QRBN]))?$')
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+TOKEN_PATTERN = re.compile(r'\s*(\{|\(|\)|;|[^\s{}();]+)')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+UCI_PATTERN = re.compile(r'^[a-h][1-8][a-h][1-8][qrbn]?$')
+
+# One game read from a PGN stream: tag pairs, SAN moves of the main line and the result
+PGNGame = collections.namedtuple('PGNGame', ['headers', 'moves', 'result'])
+
+def move_to_uci(start, end, promotion=None):
+    uci = square_name(start) + square_name(end)
+    if promotion:
+        uci += PIECE_LETTERS[promotion].lower()
+    return uci
+
+def uci_to_move(uci):
+    """(start, end, promotion) of a UCI move like 'e2e4' or 'e7e8q'; raises ValueError"""
+    if not UCI_PATTERN.match(uci):
+        raise ValueError(f"Bad UCI move: {uci!r}")
+    promotion = LETTER_PIECES[uci[4].upper()] if len(uci) == 5 else None
+    return parse_square(uci[:2]), parse_square(uci[2:4]), promotion
+
+def move_to_san(board, start, end, promotion=None):
+    """SAN for a move on the board before it is played"""
+    piece = board[start[0]][start[1]]
+    color, piece_type = piece
+    capture = bool(board[end[0]][end[1]])
+    
+    if piece_type == 'pawn':
+        san = (square_name(start)[0] + 'x' if capture else '') + square_name(end)
+        if promotion:
+            san += '=' + PIECE_LETTERS[promotion]
+    else:
+        # Disambiguate between pieces of the same type that can reach the same square
+        rivals = []
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                if (row, col) != start and board[row][col] == piece and end in get_valid_moves(board, (row, col), piece):
+                    rivals.append((row, col))
+        prefix = ''
+        if rivals:
+            if all(col != start[1] for _, col in rivals):
+                prefix = square_name(start)[0]
+            elif all(row != start[0] for row, _ in rivals):
+                prefix = square_name(start)[1]
+            else:
+                prefix = square_name(start)
+        san = PIECE_LETTERS[piece_type] + prefix + ('x' if capture else '') + square_name(end)
+    
+    # Check and mate suffixes
+    after = [row[:] for row in board]
+    make_move(after, start, end, promotion)
+    opponent = 'black' if color == 'white' else 'white'
+    if is_checkmate(after, opponent):
+        san += '#'
+    elif is_in_check(after, opponent):
+        san += '+'
+    return san
+
+def san_to_move(board, san, color):
+    """Resolve a SAN move for color on board; returns (start, end, promotion)"""
+    match = SAN_PATTERN.match(san.rstrip('+#!?'))
+    if not match:
+        raise ValueError(f"Unsupported SAN move: {san}")
+    letter, from_file, from_rank, target, promotion_letter = match.groups()
+    piece = (color, LETTER_PIECES[letter] if letter else 'pawn')
+    end = parse_square(target)
+    
+    candidates = []
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            if board[row][col] != piece:
+                continue
+            name = square_name((row, col))
+            if from_file and name[0] != from_file or from_rank and name[1] != from_rank:
+                continue
+            if end in get_valid_moves(board, (row, col), piece):
+                candidates.append((row, col))
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} SAN move: {san}")
+    return candidates[0], end, LETTER_PIECES[promotion_letter] if promotion_letter else None
+
+class GameRecord:
+    """Moves of one game as played, exported as SAN, UCI or PGN"""
+    def __init__(self, board, white='?', black='?', event='Casual Game', site='Chess Game'):
+        self.initial_board = [row[:] for row in board]
+        self.headers = {
+            'Event': event,
+            'Site': site,
+            'Date': time.strftime('%Y.%m.%d'),
+            'Round': '-',
+            'White': white,
+            'Black': black,
+            'Result': '*',
+        }
+        self.moves = []  # (start, end, promotion) in the order played
+        self.saved = False
+    
+    def add_move(self, start, end, promotion=None):
+        self.moves.append((start, end, promotion))
+    
+    def uci_moves(self):
+        return [move_to_uci(*move) for move in self.moves]
+    
+    def san_moves(self):
+        # Replay from the initial position, since SAN depends on the board before each move
+        board = [row[:] for row in self.initial_board]
+        san_moves = []
+        for start, end, promotion in self.moves:
+            san_moves.append(move_to_san(board, start, end, promotion))
+            make_move(board, start, end, promotion)
+        return san_moves
+    
+    def save(self, path, result='*'):
+        """Append the game to a PGN file once; games without moves are skipped"""
+        if self.saved or not self.moves:
+            return
+        self.headers['Result'] = result
+        with open(path, 'a', encoding='utf-8') as f:
+            write_game(f, self.headers, self.san_moves(), result)
+        self.saved = True
+
+def write_game(f, headers, san_moves, result='*'):
+    """Write one game in PGN export format to a text file object"""
+    tags = [tag for tag in SEVEN_TAG_ROSTER if tag in headers]
+    tags += [tag for tag in headers if tag not in SEVEN_TAG_ROSTER]
+    for tag in tags:
+        value = str(headers[tag]).replace('\\', '\\\\').replace('"', '\\"')
+        f.write(f'[{tag} "{value}"]\n')
+    f.write('\n')
+    
+    tokens = []
+    for i, san in enumerate(san_moves):
+        if i % 2 == 0:
+            tokens.append(f"{i // 2 + 1}.")
+        tokens.append(san)
+    tokens.append(result)
+    
+    # Movetext lines stay under 80 characters
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            f.write(line + '\n')
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    f.write(line + '\n\n')
+
+def read_games(source):
+    """Yield PGNGame tuples one at a time from a PGN path or text file object
+    
+    The file is read line by line, so memory use does not depend on the archive size.
+    Comments, variations and NAGs are skipped.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding='utf-8', errors='replace') as f:
+            yield from read_games(f)
+        return
+    
+    headers, moves = {}, []
+    in_comment = False
+    variation_depth = 0
+    for line in source:
+        if not in_comment and variation_depth == 0:
+            stripped = line.strip()
+            if stripped.startswith('['):
+                if moves:
+                    # The previous game ended without a result token
+                    yield PGNGame(headers, moves, headers.get('Result', '*'))
+                    headers, moves = {}, []
+                match = TAG_PATTERN.match(stripped)
+                if match:
+                    headers[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+                continue
+            if stripped.startswith('%'):
+                continue
+        
+        pos = 0
+        while pos < len(line):
+            if in_comment:
+                end = line.find('}', pos)
+                if end < 0:
+                    break
+                in_comment = False
+                pos = end + 1
+                continue
+            match = TOKEN_PATTERN.match(line, pos)
+            if not match:
+                break
+            pos = match.end()
+            token = match.group(1)
+            
+            if token == '{':
+                in_comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                variation_depth += 1
+            elif token == ')':
+                variation_depth = max(0, variation_depth - 1)
+            elif variation_depth or token.startswith('$'):
+                continue
+            elif token in RESULTS:
+                yield PGNGame(headers, moves, token)
+                headers, moves = {}, []
+            else:
+                token = MOVE_NUMBER_PATTERN.sub('', token).rstrip('!?')
+                if token:
+                    moves.append(token)
+    
+    if headers or moves:
+        yield PGNGame(headers, moves, headers.get('Result', '*'))
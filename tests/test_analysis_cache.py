@@ -0,0 +1,41 @@
+import chess_engine
+from analysis_cache import EXACT, LOWER, AnalysisCache
+
+def test_store_probe_round_trip(tmp_path):
+    cache = AnalysisCache(str(tmp_path / 'cache.sqlite'), version=1, batch_size=2)
+    cache.store(1 << 63, 3, 42.0, EXACT, 0x123)
+    cache.store(5, 2, -7.0, LOWER)
+    assert cache.probe(1 << 63, 3) == (42.0, EXACT, 0x123)
+    assert cache.probe(1 << 63, 4) is None  # Stored result is too shallow
+    assert cache.probe(5, 1) == (-7.0, LOWER, None)
+    assert len(cache) == 2
+    cache.close()
+
+def test_other_engine_version_empties_the_cache(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = AnalysisCache(path, version=1)
+    cache.store(5, 2, 1.0, EXACT)
+    cache.close()
+    cache = AnalysisCache(path, version=1)
+    assert len(cache) == 1
+    cache.close()
+    cache = AnalysisCache(path, version=2)
+    assert len(cache) == 0
+    cache.close()
+
+def test_prune_keeps_most_recently_used(tmp_path):
+    cache = AnalysisCache(str(tmp_path / 'cache.sqlite'), version=1, max_entries=2, batch_size=1, prune_interval=1)
+    for position in range(1, 4):
+        cache.store(position, 2, 0.0, EXACT)
+    assert len(cache) == 2
+    assert cache.probe(1, 2) is None
+    cache.close()
+
+def test_evaluation_key_follows_parameters(monkeypatch):
+    key = chess_engine.evaluation_key
+    monkeypatch.setitem(chess_engine.PIECE_VALUES, 'queen', 950)
+    chess_engine.clear_evaluation_cache()
+    assert chess_engine.evaluation_key != key
+    monkeypatch.undo()
+    chess_engine.clear_evaluation_cache()
+    assert chess_engine.evaluation_key == key
@@ -0,0 +1,25 @@
+import numpy as np
+
+from batch_eval import PIECE_CODES, evaluate_boards, evaluation_table, pack_board, pack_boards
+from chess_engine import create_board, evaluate_board
+
+def test_default_table_matches_evaluate_board():
+    board = create_board()
+    board[6][4] = ''
+    board[1][3] = ''
+    board[0][1] = ''
+    assert evaluate_boards(pack_board(board)) == evaluate_board(board)
+
+def test_piece_square_bonus_is_mirrored_for_black():
+    piece_square = np.zeros((6, 64))
+    piece_square[0] = np.repeat(np.arange(8)[::-1] * 10, 8)  # Pawns gain 10 per row advanced
+    table = evaluation_table(piece_square)
+    white = [[''] * 8 for _ in range(8)]
+    black = [[''] * 8 for _ in range(8)]
+    white[4][3] = ('white', 'pawn')  # d4
+    black[3][3] = ('black', 'pawn')  # d5, the mirror image
+    white_score, black_score = evaluate_boards(pack_boards([white, black]), table)
+    assert white_score == -black_score
+    assert table[PIECE_CODES[('black', 'pawn')], 6 * 8] == -table[PIECE_CODES[('white', 'pawn')], 1 * 8]
+    # The starting position is symmetric, so any bonus cancels out
+    assert evaluate_boards(pack_board(create_board()), table) == 0
@@ -0,0 +1,40 @@
+import csv
+import random
+
+from batch_ratings import main
+from chess_engine import create_board, get_all_moves, make_move
+from game_archive import ArchiveWriter
+
+def add_games(path, count, rng):
+    with ArchiveWriter(path) as writer:
+        for _ in range(count):
+            board = create_board()
+            moves = []
+            color = 'white'
+            for _ in range(rng.randrange(4, 20)):
+                legal = get_all_moves(board, color)
+                if not legal:
+                    break
+                start, end = rng.choice(legal)
+                make_move(board, start, end)
+                moves.append((start, end, None))
+                color = 'black' if color == 'white' else 'white'
+            white, black = rng.sample(['ann', 'bob', 'cid'], 2)
+            writer.add_game(moves, white, black, rng.choice(['1-0', '0-1', '1/2-1/2']))
+
+def read_ratings(path):
+    with open(path, newline='') as f:
+        return sorted(map(tuple, csv.reader(f)))
+
+def test_rerun_rates_games_appended_to_the_last_chunk(tmp_path):
+    rng = random.Random(3)
+    archive = str(tmp_path / 'games.cga')
+    add_games(archive, 10, rng)
+    output = str(tmp_path / 'ratings.csv')
+    main([archive, '--output', output, '--workers', '1', '--chunk-size', '4'])
+    add_games(archive, 5, rng)
+    main([archive, '--output', output, '--workers', '1', '--chunk-size', '4'])
+    fresh = str(tmp_path / 'fresh.csv')
+    main([archive, '--output', fresh, '--workers', '1', '--chunk-size', '4'])
+    assert read_ratings(output) == read_ratings(fresh)
+    assert sum(int(row[1]) for row in read_ratings(output) if row[0] != 'player') == 30
@@ -0,0 +1,176 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import chess_engine
+from chess_engine import (BOARD_SIZE, FIFTY_MOVE_PLIES, PlayerStats, PositionHistory, choose_move_at_level,
+                          create_board, evaluate_board, evaluate_position, get_all_moves, hash_after_move, make_move,
+                          make_move_with_stats,
+                          parse_square, pawn_structure_score, position_hash, search, static_exchange)
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_chess_params_loaded_at_import(tmp_path):
+    params = tmp_path / 'params.json'
+    params.write_text(json.dumps({'piece_values': {'queen': 950}, 'pawn_structure': {'doubled': -20}}))
+    env = dict(os.environ, CHESS_PARAMS=str(params))
+    result = subprocess.run([sys.executable, '-c', "import chess_engine; "
+                             "print(chess_engine.PIECE_VALUES['queen'], chess_engine.PAWN_STRUCTURE['doubled'])"],
+                            cwd=REPO, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['950', '-20']
+
+def test_pawn_structure_terms():
+    # Doubled, isolated and passed white pawns on the a-file
+    assert pawn_structure_score([(6, 0), (5, 0)], []) == -15 - 2 * 12 + 5 + 10
+    # Both pawns are passed and isolated; white's is on the seventh rank
+    assert pawn_structure_score([(1, 4)], [(1, 3)]) == (100 - 12) - (5 - 12)
+
+def test_evaluate_position_cache_matches_uncached():
+    board = create_board()
+    board[6][4] = ''
+    board[4][4] = ('white', 'pawn')
+    chess_engine.clear_evaluation_cache()
+    uncached = evaluate_position(board)
+    position = position_hash(board, 'black')
+    assert evaluate_position(board, position) == uncached
+    assert evaluate_position(board, position) == uncached  # Served from the eval table
+    assert evaluate_board(create_board()) == evaluate_position(create_board()) == 0
+
+def test_choose_move_at_level_stays_within_budget(monkeypatch):
+    stats = []
+    
+    class RecordedStats(chess_engine.SearchStats):
+        def __init__(self, side):
+            super().__init__(side)
+            stats.append(self)
+    
+    monkeypatch.setattr(chess_engine, 'SearchStats', RecordedStats)
+    rng = random.Random(7)
+    board = create_board()
+    history = PositionHistory(board, 'white')
+    for level, settings in chess_engine.STRENGTH_LEVELS.items():
+        start, end = choose_move_at_level(board, 'white', level, rng, history)
+        assert end in chess_engine.get_valid_moves(board, start, board[start[0]][start[1]])
+        assert stats[-1].nodes + stats[-1].qnodes <= settings['nodes'] + 1
+        assert len(history.hashes) == 1
+
+def test_choose_move_at_level_takes_a_hanging_queen():
+    board = [[''] * 8 for _ in range(8)]
+    board[7][4] = ('white', 'king')
+    board[0][4] = ('black', 'king')
+    board[4][3] = ('white', 'rook')
+    board[4][6] = ('black', 'queen')
+    moves = [choose_move_at_level(board, 'white', 'medium', random.Random(seed)) for seed in range(5)]
+    assert moves.count(((4, 3), (4, 6))) >= 4
+
+def test_search_interrupted_at_depth_one_still_moves():
+    board = create_board()
+    for limits in ({'hard_limit': 0}, {'node_limit': 1}, {'node_limit': 30}):
+        score, move, stats = search(board, 3, True, cache=None, **limits)
+        assert stats.aborted and stats.depth == 0 and score is None
+        assert move in get_all_moves(board, 'white')
+
+def test_choose_move_at_level_respects_hard_limit():
+    board = create_board()
+    move = choose_move_at_level(board, 'black', 'medium', random.Random(1), hard_limit=0)
+    assert move in get_all_moves(board, 'black')
+
+def test_iterative_deepening_matches_fixed_depth():
+    board = create_board()
+    for start, end in [((6, 4), (4, 4)), ((1, 3), (3, 3)), ((7, 6), (5, 5))]:
+        chess_engine.make_move(board, start, end)
+    reports = []
+    fixed = search(board, 3, False, cache=None)
+    deepened = search(board, 3, False, telemetry=reports.append, cache=None)
+    assert fixed[:2] == deepened[:2]
+    assert fixed[2].depth_nodes[0] == fixed[2].nodes and len(deepened[2].depth_nodes) == 3
+    assert reports[0]['depth'] == 3
+
+def test_hash_after_move_matches_position_hash():
+    rng = random.Random(11)
+    for _ in range(4):
+        board = create_board()
+        color = 'white'
+        position = position_hash(board, color)
+        for _ in range(150):
+            moves = get_all_moves(board, color)
+            if not moves:
+                break
+            start, end = rng.choice(moves)
+            promotion = 'rook' if board[start[0]][start[1]][1] == 'pawn' and end[0] in (0, BOARD_SIZE - 1) else None
+            position = hash_after_move(position, board, start, end, promotion)
+            make_move(board, start, end, promotion)
+            color = 'black' if color == 'white' else 'white'
+            assert position == position_hash(board, color)
+
+def test_threefold_repetition():
+    board = create_board()
+    history = PositionHistory(board, 'white')
+    shuffle = [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))]
+    for count in range(2):
+        for start, end in shuffle:
+            history.push_move(board, start, end)
+            make_move(board, start, end)
+        assert history.repetitions() == count + 1
+    assert history.is_draw() and history.is_draw(repetitions=1)
+    history.pop()
+    assert not history.is_draw()
+    # A pawn move makes the earlier positions unreachable
+    history.push_move(board, (6, 4), (4, 4))
+    assert history.clocks[-1] == 0 and history.repetitions() == 0
+
+def test_fifty_move_rule():
+    history = PositionHistory(create_board(), 'white')
+    for position in range(1, FIFTY_MOVE_PLIES):
+        history.push(position, False)
+    assert not history.is_draw()
+    history.push(FIFTY_MOVE_PLIES, False)
+    assert history.is_draw()
+    history.push(0, True)
+    assert not history.is_draw()
+
+def board_with(pieces):
+    board = [[''] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+    for square, piece in pieces.items():
+        row, col = parse_square(square)
+        board[row][col] = piece
+    return board
+
+def test_static_exchange():
+    white_king, black_king = ('white', 'king'), ('black', 'king')
+    cases = [
+        # Queen takes a pawn defended by a pawn
+        ({'d1': ('white', 'queen'), 'd5': ('black', 'pawn'), 'e6': ('black', 'pawn')}, 'd1', 'd5', -800),
+        # Pawn takes an undefended pawn
+        ({'e4': ('white', 'pawn'), 'd5': ('black', 'pawn')}, 'e4', 'd5', 100),
+        # Knight takes a pawn defended by a pawn
+        ({'f3': ('white', 'knight'), 'e5': ('black', 'pawn'), 'd6': ('black', 'pawn')}, 'f3', 'e5', -220),
+        # Knight takes a bishop defended by a pawn
+        ({'f3': ('white', 'knight'), 'e5': ('black', 'bishop'), 'd6': ('black', 'pawn')}, 'f3', 'e5', 10),
+        # Doubled rooks win a pawn defended by one rook: the rear rook joins through the front one
+        ({'e1': ('white', 'rook'), 'e2': ('white', 'rook'), 'e5': ('black', 'pawn'), 'e8': ('black', 'rook')},
+         'e2', 'e5', 100),
+        # Knight takes a pawn; recapturing would cost black its knight to the e4 pawn
+        ({'c3': ('white', 'knight'), 'd5': ('black', 'pawn'), 'f6': ('black', 'knight'), 'e4': ('white', 'pawn')},
+         'c3', 'd5', 100),
+    ]
+    for pieces, start, end, expected in cases:
+        board = board_with(dict(pieces, a1=white_king, h8=black_king))
+        assert static_exchange(board, parse_square(start), parse_square(end)) == expected, (start, end)
+
+def test_capture_promotion_keeps_tracked_stats_in_step():
+    board = board_with({'g2': ('black', 'pawn'), 'b7': ('black', 'pawn'), 'h1': ('white', 'rook'),
+                        'a2': ('white', 'pawn'), 'e1': ('white', 'king'), 'e8': ('black', 'king')})
+    white_stats, black_stats = PlayerStats('white'), PlayerStats('black')
+    white_stats.track_position(board)
+    black_stats.track_position(board)
+    captured = make_move_with_stats(board, parse_square('g2'), parse_square('h1'), 'queen', black_stats, white_stats)
+    assert captured == ('white', 'rook') and board[7][7] == ('black', 'queen')
+    for stats in (white_stats, black_stats):
+        rescanned = PlayerStats(stats.color)
+        rescanned.track_position(board)
+        assert stats.pawn_files == rescanned.pawn_files
+    assert black_stats.pieces_developed == set()
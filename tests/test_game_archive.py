@@ -0,0 +1,33 @@
+from game_archive import ArchiveWriter, GameArchive, decode_moves, import_pgn
+
+GAMES = [
+    ([((6, 4), (4, 4), None), ((1, 4), (3, 4), None), ((7, 6), (5, 5), None)], 'Ann', 'Bob', '1-0', 20240102),
+    ([], 'Bob', 'Cid', '*', 0),
+    ([((1, 0), (0, 1), 'queen'), ((6, 7), (7, 7), 'knight')], 'Cid', 'Ann', '1/2-1/2', 19991231),
+]
+
+def test_games_read_back_by_index_and_in_order(tmp_path):
+    path = str(tmp_path / 'games.cga')
+    with ArchiveWriter(path) as writer:
+        writer.add_game(*GAMES[0])
+    with ArchiveWriter(path) as writer:  # Appending reuses the player ids
+        for game in GAMES[1:]:
+            writer.add_game(*game)
+    with GameArchive(path) as archive:
+        assert len(archive) == len(GAMES)
+        assert archive.player_names == ['Ann', 'Bob', 'Cid']
+        for games in ([archive[n] for n in range(len(archive))], list(archive)):
+            for game, (moves, white, black, result, date) in zip(games, GAMES, strict=True):
+                assert (game.white, game.black, game.result, game.date) == (white, black, result, date)
+                assert decode_moves(game.moves) == moves
+
+def test_import_pgn_skips_illegal_games(tmp_path):
+    pgn_path = tmp_path / 'games.pgn'
+    pgn_path.write_text('[White "A"]\n[Black "B"]\n[Date "2024.05.06"]\n\n1. e4 e5 2. Nf3 1-0\n\n'
+                        '[White "C"]\n[Black "D"]\n\n1. e4 e4 0-1\n')
+    archive_path = str(tmp_path / 'games.cga')
+    assert import_pgn(str(pgn_path), archive_path) == (1, 1)
+    with GameArchive(archive_path) as archive:
+        game = archive[0]
+        assert (game.white, game.black, game.result, game.date) == ('A', 'B', '1-0', 20240506)
+        assert decode_moves(game.moves) == [((6, 4), (4, 4), None), ((1, 4), (3, 4), None), ((7, 6), (5, 5), None)]
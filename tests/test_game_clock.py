@@ -0,0 +1,49 @@
+import pytest
+
+import game_clock
+from game_clock import (MAX_TIME_FRACTION, MOVE_OVERHEAD, GameClock, allocate_time, format_clock,
+                        parse_time_control)
+
+def test_parse_time_control():
+    assert parse_time_control('300+2') == (300, 2)
+    assert parse_time_control('60') == (60, 0)
+    for text in ('-5+1', '5+-1', 'fast', 'nan', '5+inf', 'inf+0', '-0.5'):
+        with pytest.raises(ValueError):
+            parse_time_control(text)
+
+def test_format_clock():
+    assert format_clock(125.7) == '2:05'
+    assert format_clock(9.56) == '9.6'
+    assert format_clock(-3) == '0.0'
+
+def test_allocate_time():
+    soft, hard = allocate_time(300, 0, 0, 30)
+    assert soft == pytest.approx((300 - MOVE_OVERHEAD) / 60) and soft < hard
+    assert allocate_time(300, 2, 0, 30)[0] == pytest.approx(soft + 1.5)  # Most of the increment
+    assert allocate_time(300, 0, 0, 60)[0] > soft > allocate_time(300, 0, 0, 5)[0]
+    assert allocate_time(300, 0, 0, 30, in_check=True)[0] > soft
+    assert allocate_time(300, 0, 0, 1) == (0, 0)  # Forced move
+    # Late in the game the remaining time is spread over at least MIN_MOVES_TO_GO moves
+    assert allocate_time(300, 0, 100, 30) == allocate_time(300, 0, 60, 30)
+    # However little time is left, the hard limit keeps a margin
+    for remaining in (0.05, 0.5, 3):
+        soft, hard = allocate_time(remaining, 10, 0, 45, in_check=True)
+        assert soft <= hard <= max(remaining - MOVE_OVERHEAD, 0) * MAX_TIME_FRACTION
+
+def test_game_clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(game_clock.time, 'monotonic', lambda: now[0])
+    clock = GameClock(60, 5)
+    clock.start('white')
+    now[0] += 10
+    assert clock.remaining('white') == 50 and clock.remaining('black') == 60
+    clock.press()
+    now[0] += 20
+    assert clock.remaining('white') == 55 and clock.remaining('black') == 40
+    clock.press()
+    assert clock.times == {'white': 55, 'black': 45} and clock.running == 'white'
+    assert clock.flagged() is None
+    now[0] += 55
+    assert clock.flagged() == 'white'
+    clock.stop()
+    assert clock.remaining('white') == 0 and clock.running is None
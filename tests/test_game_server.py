@@ -0,0 +1,39 @@
+import asyncio
+import concurrent.futures
+import json
+
+from game_server import GameServer
+
+class BrokenExecutor:
+    """Stands in for a process pool whose worker died"""
+    def submit(self, *args):
+        future = concurrent.futures.Future()
+        future.set_exception(concurrent.futures.process.BrokenProcessPool("worker died"))
+        return future
+    
+    def shutdown(self, **kwargs):
+        pass
+
+def test_engine_failure_replies_with_an_error_and_keeps_the_session():
+    async def run():
+        game_server = GameServer(1, 2, 10)
+        game_server.executor.shutdown()
+        game_server.executor = BrokenExecutor()
+        server = await asyncio.start_server(game_server.handle_client, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname())
+        
+        async def request(**fields):
+            writer.write(json.dumps(fields).encode() + b'\n')
+            return json.loads(await reader.readline())
+        
+        game = (await request(op='new', ai='black', level='easy'))['game']
+        reply = await request(op='move', game=game, move='e2e4', id=7)
+        assert not reply['ok'] and 'crashed' in reply['error'] and reply['id'] == 7
+        assert not isinstance(game_server.executor, BrokenExecutor)  # A fresh pool took its place
+        reply = await request(op='go', game=game)
+        assert reply['ok'] and reply['turn'] == 'white' and reply['ai_move']
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        game_server.shutdown()
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+import struct
+import time
+
+import pytest
+
+import net_play
+from game_archive import decode_move, encode_move
+
+def test_decode_move_round_trips_encode_move():
+    for move in [((6, 4), (4, 4), None), ((1, 0), (0, 0), 'queen'), ((6, 7), (7, 6), 'knight')]:
+        assert decode_move(encode_move(*move)) == move
+
+@pytest.mark.parametrize('code', [5 << 12, 7 << 12 | 0x3F, 1 << 15, -1])
+def test_decode_move_rejects_invalid_codes(code):
+    with pytest.raises(ValueError):
+        decode_move(code)
+
+def test_decode_move_message_checks_length():
+    payload = net_play.MOVE_PAYLOAD.pack(3, encode_move((6, 4), (4, 4)), 1 << 63)
+    assert net_play.decode_move_message(payload) == (3, encode_move((6, 4), (4, 4)), 1 << 63)
+    for bad in (payload[:-1], payload + b'\x00', b''):
+        with pytest.raises(ValueError):
+            net_play.decode_move_message(bad)
+
+def test_decode_history_checks_move_count():
+    codes = [encode_move((6, 4), (4, 4)), encode_move((1, 4), (3, 4))]
+    payload = net_play.COUNT.pack(len(codes)) + struct.pack('<2H', *codes)
+    assert net_play.decode_history(payload) == codes
+    assert net_play.decode_history(net_play.COUNT.pack(0)) == []
+    for bad in (b'', b'\x02', payload[:-1], net_play.COUNT.pack(3) + payload[2:]):
+        with pytest.raises(ValueError):
+            net_play.decode_history(bad)
+
+def poll_until(peers, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    received = {peer: [] for peer in peers}
+    while not condition(received) and time.monotonic() < deadline:
+        for peer in peers:
+            received[peer] += peer.poll()
+        time.sleep(0.01)
+    return received
+
+def test_join_by_host_name():
+    host = net_play.NetPeer.host(0)
+    port = host.listener.getsockname()[1]
+    guest = net_play.NetPeer.join(f'localhost:{port}')
+    guest.send_hello('guest')  # Queued until the lookup and the connection finish
+    host.send_hello('host')
+    received = poll_until([host, guest], lambda received: all(received.values()))
+    assert received[host] == [(net_play.HELLO, b'guest')] and received[guest] == [(net_play.HELLO, b'host')]
+    host.close()
+    guest.close()
+
+def test_join_unknown_host_closes_the_peer():
+    guest = net_play.NetPeer.join('no-such-host.invalid')
+    poll_until([guest], lambda received: guest.closed, timeout=30)
+    assert guest.closed and isinstance(guest.error, OSError)
@@ -0,0 +1,48 @@
+import io
+import random
+
+from chess_engine import BOARD_SIZE, create_board, get_all_moves, make_move
+from pgn import GameRecord, move_to_uci, read_games, san_to_move, uci_to_move
+
+def random_game(rng, plies):
+    board = create_board()
+    record = GameRecord(board, 'Ann', 'Bob "the rook"')
+    color = 'white'
+    for _ in range(plies):
+        moves = get_all_moves(board, color)
+        if not moves:
+            break
+        start, end = rng.choice(moves)
+        piece = board[start[0]][start[1]]
+        promotion = rng.choice(['queen', 'knight']) if piece[1] == 'pawn' and end[0] in (0, BOARD_SIZE - 1) else None
+        record.add_move(start, end, promotion)
+        make_move(board, start, end, promotion)
+        color = 'black' if color == 'white' else 'white'
+    return record
+
+def test_saved_games_read_back_to_the_same_moves(tmp_path):
+    rng = random.Random(5)
+    path = tmp_path / 'games.pgn'
+    records = [random_game(rng, 200) for _ in range(6)]
+    for record in records:
+        record.save(str(path), '1/2-1/2')
+    games = list(read_games(str(path)))
+    assert len(games) == len(records)
+    for record, game in zip(records, games):
+        assert game.headers['Black'] == 'Bob "the rook"' and game.result == '1/2-1/2'
+        board = create_board()
+        color = 'white'
+        for move, san in zip(record.moves, game.moves):
+            assert san_to_move(board, san, color) == move
+            make_move(board, *move)
+            color = 'black' if color == 'white' else 'white'
+        assert len(game.moves) == len(record.moves)
+
+def test_read_games_skips_comments_and_variations():
+    text = '[White "A"]\n\n1. e4 {best by test} e5 (1... c5 2. Nf3) 2. Nf3 $1 ; quiet\nNc6 *\n'
+    game, = read_games(io.StringIO(text))
+    assert game.moves == ['e4', 'e5', 'Nf3', 'Nc6'] and game.result == '*'
+
+def test_uci_round_trip():
+    for uci in ['e2e4', 'a7a8q', 'h2h1n']:
+        assert move_to_uci(*uci_to_move(uci)) == uci
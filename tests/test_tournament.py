@@ -0,0 +1,26 @@
+import pytest
+
+from tournament import load_openings, main, parse_engine
+
+def test_parse_engine():
+    config = parse_engine('test:depth=3,queen=950,mode=random')
+    assert (config['name'], config['depth'], config['mode'], config['piece_values']) == ('test', 3, 'random', {'queen': 950})
+    assert parse_engine('weak:level=easy')['mode'] == 'level'
+    for spec in ('x:mode=serach', 'x:mode=level', 'x:level=grandmaster', 'x:speed=1'):
+        with pytest.raises(ValueError):
+            parse_engine(spec)
+
+def test_load_openings(tmp_path):
+    path = tmp_path / 'openings.txt'
+    path.write_text('# comment\ne4 e5 Nf3\n\nd4 d5\n')
+    assert load_openings(str(path)) == [['e4', 'e5', 'Nf3'], ['d4', 'd5']]
+    path.write_text('e4 e5\ne4 e4\n')
+    with pytest.raises(ValueError, match=':2:'):
+        load_openings(str(path))
+
+def test_bad_opening_stops_before_the_pool(tmp_path, capsys):
+    path = tmp_path / 'openings.txt'
+    path.write_text('e4 e5 Qh6\n')
+    with pytest.raises(SystemExit):
+        main(['--engine', 'a:mode=random', '--engine', 'b:mode=random', '--openings', str(path), '--games', '2'])
+    assert 'openings.txt:1: Illegal SAN move: Qh6' in capsys.readouterr().err
@@ -0,0 +1,167 @@
+"""Texel tuning of PIECE_VALUES from archived games
+
+Extracts quiet positions with their game results from one or more archives, encodes them
+as an int8 NumPy feature matrix (white minus black count of each piece type) and fits the
+piece values by minimizing the squared error between the game result and a sigmoid of the
+evaluation, using full-batch vectorized gradient steps:
+
+    python texel_tune.py games.cga --output params.json
+    CHESS_PARAMS=params.json python main.py
+
+The pawn stays at 100 to anchor the scale. The fitted values also set the pawn-unit
+piece values in SKILL_METRICS.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from chess_engine import PIECE_VALUES, create_board, is_in_check, make_move
+from game_archive import GameArchive, decode_move
+
+FEATURE_PIECES = ('pawn', 'knight', 'bishop', 'rook', 'queen')
+RESULT_SCORES = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+BATCH_ROWS = 1 << 20  # Rows per vectorized step, bounds the float temporaries to a few tens of MB
+
+def material_features(board):
+    features = [0] * len(FEATURE_PIECES)
+    for row in board:
+        for piece in row:
+            if piece and piece[1] != 'king':
+                features[FEATURE_PIECES.index(piece[1])] += 1 if piece[0] == 'white' else -1
+    return features
+
+def extract_chunk(task):
+    """Quiet positions of games [start, stop); returns (features, results)"""
+    path, start, stop, skip_plies = task
+    features = []
+    results = []
+    with GameArchive(path) as archive:
+        for n in range(start, stop):
+            game = archive[n]
+            if game.result not in RESULT_SCORES:
+                continue
+            board = create_board()
+            color = 'white'
+            for ply, code in enumerate(game.moves):
+                start_pos, end_pos, promotion = decode_move(code)
+                captured_piece = make_move(board, start_pos, end_pos, promotion)
+                color = 'black' if color == 'white' else 'white'
+                # Positions right after a capture or with the side to move in check are not quiet
+                if ply < skip_plies or captured_piece or promotion or is_in_check(board, color):
+                    continue
+                features.append(material_features(board))
+                results.append(RESULT_SCORES[game.result])
+    return (np.array(features, dtype=np.int8).reshape(-1, len(FEATURE_PIECES)),
+            np.array(results, dtype=np.float32))
+
+def extract_positions(paths, workers, chunk_size, skip_plies):
+    tasks = []
+    for path in paths:
+        with GameArchive(path) as archive:
+            game_count = len(archive)
+        tasks.extend((path, start, min(game_count, start + chunk_size), skip_plies)
+                     for start in range(0, game_count, chunk_size))
+    with multiprocessing.Pool(workers) as pool:
+        chunks = pool.map(extract_chunk, tasks)
+    if not chunks:
+        return np.zeros((0, len(FEATURE_PIECES)), dtype=np.int8), np.zeros(0, dtype=np.float32)
+    return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+def evaluation_error(features, results, weights, scale, gradient=False):
+    """Mean squared error of sigmoid(evaluation) against results, and optionally its gradient"""
+    total = 0.0
+    grad = np.zeros_like(weights)
+    for begin in range(0, len(results), BATCH_ROWS):
+        x = features[begin:begin + BATCH_ROWS].astype(np.float64)
+        target = results[begin:begin + BATCH_ROWS]
+        predicted = 1 / (1 + 10 ** (-scale * (x @ weights) / 400))
+        error = predicted - target
+        total += error @ error
+        if gradient:
+            grad += x.T @ (error * predicted * (1 - predicted))
+    count = max(len(results), 1)
+    if gradient:
+        return total / count, grad * 2 * scale * math.log(10) / 400 / count
+    return total / count
+
+def fit_scale(features, results, weights, low=0.05, high=5.0, steps=40):
+    """Golden-section search for the sigmoid scale that best fits the current weights"""
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(steps):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        if evaluation_error(features, results, weights, a) < evaluation_error(features, results, weights, b):
+            high = b
+        else:
+            low = a
+    return (low + high) / 2
+
+def tune(features, results, weights, scale, iterations, learning_rate):
+    """Adam steps on every piece value except the pawn; returns (weights, error)"""
+    weights = weights.astype(np.float64)
+    mask = np.ones_like(weights)
+    mask[FEATURE_PIECES.index('pawn')] = 0
+    moment = np.zeros_like(weights)
+    velocity = np.zeros_like(weights)
+    beta1, beta2 = 0.9, 0.999
+    for step in range(1, iterations + 1):
+        error, grad = evaluation_error(features, results, weights, scale, gradient=True)
+        grad *= mask
+        moment = beta1 * moment + (1 - beta1) * grad
+        velocity = beta2 * velocity + (1 - beta2) * grad * grad
+        weights -= learning_rate * (moment / (1 - beta1 ** step)) / (np.sqrt(velocity / (1 - beta2 ** step)) + 1e-12)
+        if step % 100 == 0:
+            print(f"Step {step}: error {error:.6f}", file=sys.stderr)
+    return weights, evaluation_error(features, results, weights, scale)
+
+def write_parameters(path, weights, scale, error, positions):
+    piece_values = dict(PIECE_VALUES)
+    for piece, value in zip(FEATURE_PIECES, weights):
+        piece_values[piece] = int(round(value))
+    skill_piece_values = {piece: round(value / piece_values['pawn'], 1)
+                          for piece, value in piece_values.items() if piece != 'king'}
+    with open(path, 'w') as f:
+        json.dump({'piece_values': piece_values, 'skill_piece_values': skill_piece_values,
+                   'scale': scale, 'error': error, 'positions': positions}, f, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune piece values on quiet positions from game archives")
+    parser.add_argument('archives', nargs='+', help="archives written by game_archive.py")
+    parser.add_argument('--output', default='params.json', help="parameter file for CHESS_PARAMS")
+    parser.add_argument('--dataset', help="cache the extracted positions in this .npz file and reuse it")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=1000, help="games per extraction task")
+    parser.add_argument('--skip-plies', type=int, default=8, help="opening plies left out of the dataset")
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--learning-rate', type=float, default=2.0, help="Adam step size in centipawns")
+    args = parser.parse_args(argv)
+    
+    start_time = time.time()
+    if args.dataset and os.path.exists(args.dataset):
+        with np.load(args.dataset) as dataset:
+            features, results = dataset['features'], dataset['results']
+    else:
+        features, results = extract_positions(args.archives, args.workers, args.chunk_size, args.skip_plies)
+        if args.dataset:
+            np.savez(args.dataset, features=features, results=results)
+    print(f"{len(results)} quiet positions ready in {time.time() - start_time:.1f}s", file=sys.stderr)
+    if not len(results):
+        return "No quiet positions with a known result in the archives"
+    
+    weights = np.array([PIECE_VALUES[piece] for piece in FEATURE_PIECES], dtype=np.float64)
+    scale = fit_scale(features, results, weights)
+    print(f"Scale {scale:.3f}, initial error {evaluation_error(features, results, weights, scale):.6f}",
+          file=sys.stderr)
+    weights, error = tune(features, results, weights, scale, args.iterations, args.learning_rate)
+    write_parameters(args.output, weights, scale, error, len(results))
+    values = ', '.join(f"{piece} {value:.0f}" for piece, value in zip(FEATURE_PIECES, weights))
+    print(f"Final error {error:.6f}: {values} -> {args.output}", file=sys.stderr)
+    
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Headless engine-vs-engine matches with live Elo and SPRT
+
+Plays two engine configurations against each other on a process pool, without pygame:
+
+    python tournament.py --engine base:depth=2 --engine test:depth=3 --games 2000 \\
+        --openings openings.txt --tc 10+0.1 --elo0 0 --elo1 10
+
+An engine spec is name:key=value,... with keys mode (search or random), depth, level (one
+of STRENGTH_LEVELS, e.g. level=easy) and any piece name (pawn, knight, ...) to override
+its PIECE_VALUES weight. Openings are one line of SAN moves each; every opening is played
+twice with colors reversed. Under a time control each engine still searches up to its
+depth, but within the per-move budget from game_clock.allocate_time.
+"""
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import chess_engine
+from chess_engine import (PositionHistory, choose_move_at_level, create_board, get_all_moves, is_checkmate,
+                          is_in_check, is_stalemate, make_move, search)
+from game_clock import allocate_time, parse_time_control
+from pgn import san_to_move
+
+DEFAULT_MAX_PLIES = 300  # Games still running after this many plies are adjudicated as draws
+BOARD_LAST_ROW = chess_engine.BOARD_SIZE - 1
+# Built-in weights, restored before each engine applies its overrides
+default_piece_values = dict(chess_engine.PIECE_VALUES)
+
+def parse_engine(spec):
+    """Engine config dict from a name:key=value,... spec"""
+    name, _, options = spec.partition(':')
+    config = {'name': name, 'mode': 'search', 'depth': 2, 'piece_values': {}}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key in chess_engine.PIECE_VALUES:
+            config['piece_values'][key] = int(value)
+        elif key == 'depth':
+            config['depth'] = int(value)
+        elif key == 'mode':
+            if value not in ('search', 'random'):
+                raise ValueError(f"Unknown mode: {value} (search or random; use level= for a strength level)")
+            config['mode'] = value
+        elif key == 'level':
+            if value not in chess_engine.STRENGTH_LEVELS:
+                raise ValueError(f"Unknown level: {value}")
+            config['mode'] = 'level'
+            config['level'] = value
+        else:
+            raise ValueError(f"Unknown engine option: {key}")
+    return config
+
+def load_openings(path):
+    """SAN move lists, one per line; raises ValueError for a line that is not a legal game start"""
+    if not path:
+        return [[]]
+    openings = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip() or line.startswith('#'):
+                continue
+            # Replay it here, since a bad opening would otherwise only fail inside a pool worker
+            board = create_board()
+            color = 'white'
+            for san in line.split():
+                try:
+                    move = san_to_move(board, san, color)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{line_number}: {e}") from None
+                make_move(board, *move)
+                color = 'black' if color == 'white' else 'white'
+            openings.append(line.split())
+    return openings
+
+def choose_move(board, color, config, rng, history, budget=(None, None)):
+    """Engine move for color; budget is the (soft, hard) thinking time in seconds"""
+    if config['mode'] == 'random':
+        moves = get_all_moves(board, color)
+        return rng.choice(moves) if moves else None
+    # Evaluation weights are per engine, so swap them in for this move
+    piece_values = dict(default_piece_values, **config['piece_values'])
+    if chess_engine.PIECE_VALUES != piece_values:
+        chess_engine.PIECE_VALUES.update(piece_values)
+        chess_engine.clear_evaluation_cache()
+    soft, hard = budget
+    if config['mode'] == 'level':
+        return choose_move_at_level(board, color, config['level'], rng, history, hard)
+    _, move, _ = search(board, config['depth'], color == 'white', history=history, soft_limit=soft, hard_limit=hard)
+    return move
+
+def play_game(task):
+    """Play one game; returns (game_id, white score, reason, plies)"""
+    game_id, white, black, opening, time_control, max_plies, seed = task
+    rng = random.Random(seed)
+    board = create_board()
+    color = 'white'
+    history = PositionHistory(board, color)
+    for san in opening:
+        move = san_to_move(board, san, color)
+        history.push_move(board, *move)
+        make_move(board, *move)
+        color = 'black' if color == 'white' else 'white'
+    
+    base, increment = time_control
+    clocks = {'white': base, 'black': base}
+    configs = {'white': white, 'black': black}
+    for ply in range(max_plies):
+        opponent = 'black' if color == 'white' else 'white'
+        if is_checkmate(board, color):
+            return game_id, (0.0 if color == 'white' else 1.0), 'checkmate', ply
+        if is_stalemate(board, color):
+            return game_id, 0.5, 'stalemate', ply
+        if history.is_draw():
+            return game_id, 0.5, 'fifty moves' if history.clocks[-1] >= chess_engine.FIFTY_MOVE_PLIES else 'repetition', ply
+        
+        budget = (None, None)
+        if base:
+            budget = allocate_time(clocks[color], increment, ply // 2, len(get_all_moves(board, color)),
+                                   is_in_check(board, color))
+        start = time.perf_counter()
+        move = choose_move(board, color, configs[color], rng, history, budget)
+        clocks[color] -= time.perf_counter() - start
+        if base and clocks[color] < 0:
+            return game_id, (0.0 if color == 'white' else 1.0), 'time', ply
+        clocks[color] += increment
+        
+        start_pos, end_pos = move
+        promotion = 'queen' if board[start_pos[0]][start_pos[1]][1] == 'pawn' and end_pos[0] in (0, BOARD_LAST_ROW) else None
+        history.push_move(board, start_pos, end_pos, promotion)
+        make_move(board, start_pos, end_pos, promotion)
+        color = opponent
+    return game_id, 0.5, 'max plies', max_plies
+
+def run_game(task):
+    """Pool task: play_game, then write its analysis, since pool workers never run atexit handlers"""
+    try:
+        return play_game(task)
+    finally:
+        chess_engine.flush_analysis_cache()
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def match_statistics(wins, draws, losses, elo0, elo1):
+    """Elo estimate, its 95% error margin and the SPRT log-likelihood ratio for engine A"""
+    games = wins + draws + losses
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    elo = elo_from_score(score)
+    if variance <= 0:
+        return elo, float('inf'), 0.0
+    margin = 1.96 * math.sqrt(variance / games)
+    error = (elo_from_score(score + margin) - elo_from_score(score - margin)) / 2
+    
+    # Trinomial GSPRT approximation of the log-likelihood ratio
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    return elo, error, llr
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other headlessly")
+    parser.add_argument('--engine', action='append', required=True, help="engine spec; give exactly two")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--openings', help="file with one opening per line in SAN")
+    parser.add_argument('--tc', default='0', help="time control per game, base+increment in seconds (0 = none)")
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--elo0', type=float, default=0.0)
+    parser.add_argument('--elo1', type=float, default=10.0)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if len(args.engine) != 2:
+        parser.error("exactly two --engine specs are required")
+    
+    try:
+        engine_a, engine_b = (parse_engine(spec) for spec in args.engine)
+        openings = load_openings(args.openings)
+        time_control = parse_time_control(args.tc)
+    except ValueError as e:
+        parser.error(str(e))
+    tasks = []
+    for game_id in range(args.games):
+        opening = openings[game_id // 2 % len(openings)]
+        white, black = (engine_a, engine_b) if game_id % 2 == 0 else (engine_b, engine_a)
+        tasks.append((game_id, white, black, opening, time_control, args.max_plies, args.seed + game_id))
+    
+    lower = math.log(args.beta / (1 - args.alpha))
+    upper = math.log((1 - args.beta) / args.alpha)
+    wins = draws = losses = 0
+    verdict = None
+    with multiprocessing.Pool(args.workers) as pool:
+        for game_id, white_score, reason, plies in pool.imap_unordered(run_game, tasks):
+            # Score from engine A's point of view
+            score = white_score if game_id % 2 == 0 else 1 - white_score
+            wins += score == 1
+            draws += score == 0.5
+            losses += score == 0
+            elo, error, llr = match_statistics(wins, draws, losses, args.elo0, args.elo1)
+            print(f"Game {wins + draws + losses}: {engine_a['name']} vs {engine_b['name']} "
+                  f"+{wins} ={draws} -{losses}  Elo {elo:+.1f} +/- {error:.1f}  "
+                  f"LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]  ({reason}, {plies} plies)", flush=True)
+            if llr >= upper:
+                verdict = 'H1 accepted: SPRT passed'
+            elif llr <= lower:
+                verdict = 'H0 accepted: SPRT failed'
+            if verdict:
+                pool.terminate()
+                break
+    print(verdict or 'SPRT inconclusive: game limit reached')
+
+if __name__ == '__main__':
+    sys.exit(main())